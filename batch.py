@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+from discovery import FunctionSource
+from feedback_loop import close_gaps
+from llm_backend import LLMBackend
+from llm_cache import default_response_cache
+from mutant_pruning import MutantPruner
+from mutation_report import MutationEventLog
+from mutation_sampling import MutantSampler
+from mutation_tester import ASTMutationRunner, ExecutionMode, MutationReport
+from rate_limit import RateLimiter
+from repair import MAX_ITERATIONS, RepairOutcome, repair_tests
+from test_generator import OpenAITestGenerator
+from unit_tests import UnitTests
+
+
+@dataclass
+class BatchResult:
+    function: FunctionSource
+    test_file: str
+    tests_pass: bool = False
+    report: Optional[MutationReport] = None
+    error: Optional[str] = None
+
+
+def test_file_for(function: FunctionSource) -> str:
+    """Each function gets its own test file next to its source, so pipelines never share one."""
+    directory = os.path.dirname(function.file)
+    name = function.qualname.replace(".", "_")
+    return os.path.join(directory, f"{function.module}_{name}_test.py")
+
+
+def _validate_and_mutate(
+    function: FunctionSource,
+    test_file: str,
+    cache_dir: Optional[str],
+    max_iterations: int,
+    pruner: Optional[MutantPruner],
+    schemata: bool,
+    execution: ExecutionMode,
+    report_dir: Optional[str],
+    feedback_iterations: int,
+    backend: Optional[LLMBackend],
+    quiet_tests: bool,
+    sampler: Optional[MutantSampler],
+) -> BatchResult:
+    """
+    Runs in a pool worker: repairs the generated tests until they pass, then runs
+    mutation testing restricted to the function they were generated for and asks
+    for tests against its surviving mutants.
+    """
+    cache = default_response_cache(cache_dir) if cache_dir else None
+    generator = OpenAITestGenerator(functions=[function], cache=cache, backend=backend)
+    unit_tests = UnitTests(quiet=quiet_tests)
+    outcome = repair_tests(generator, unit_tests, test_file, function.source, max_iterations)
+    if outcome != RepairOutcome.PASSED:
+        return BatchResult(function, test_file, error=outcome.value)
+
+    # the pool already uses every CPU, so each function mutates with a single job and
+    # the tests are not sharded either. That job still runs in a watched worker process,
+    # and the mutation cache and test statistics are safe to share between the pipelines
+    runner = ASTMutationRunner(
+        function.file,
+        test_file,
+        jobs=1,
+        cache_dir=cache_dir,
+        functions=[function.qualname],
+        pruner=pruner,
+        schemata=schemata,
+        execution=execution,
+    )
+    event_log = None
+    if report_dir is not None:
+        name = f"{function.module}_{function.qualname.replace('.', '_')}"
+        event_log = MutationEventLog(os.path.join(report_dir, name), function.file)
+    try:
+        report = runner.run(on_result=event_log, sampler=sampler)
+        if feedback_iterations > 0:
+            report = close_gaps(
+                generator,
+                runner,
+                unit_tests,
+                function.file,
+                test_file,
+                report,
+                max_iterations=feedback_iterations,
+                on_result=event_log,
+            )
+        if event_log is not None:
+            event_log.finish(report)
+    finally:
+        if event_log is not None:
+            event_log.close()
+    return BatchResult(function, test_file, tests_pass=True, report=report)
+
+
+async def run_batch(
+    functions: list[FunctionSource],
+    jobs: Optional[int] = None,
+    max_concurrency: int = 8,
+    cache_dir: Optional[str] = None,
+    max_iterations: int = MAX_ITERATIONS,
+    on_result: Optional[Callable[[BatchResult], None]] = None,
+    pruner: Optional[MutantPruner] = None,
+    schemata: bool = False,
+    execution: ExecutionMode = ExecutionMode.POOL,
+    report_dir: Optional[str] = None,
+    feedback_iterations: int = 0,
+    backend: Optional[LLMBackend] = None,
+    quiet_tests: bool = False,
+    sampler: Optional[MutantSampler] = None,
+) -> list[BatchResult]:
+    """
+    Pipelines generation, validation and mutation for every function. Generation
+    requests run concurrently under a shared rate limiter, and as soon as the tests
+    of one function are written its validation and mutation start in the shared
+    process pool while generation for the others is still in flight.
+    With a `sampler`, every function samples its own mutants with a copy of it.
+    """
+    loop = asyncio.get_running_loop()
+    cache = default_response_cache(cache_dir) if cache_dir else None
+    generator = OpenAITestGenerator(functions=[], cache=cache, backend=backend)
+    limiter = RateLimiter(max_concurrency)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+
+        async def pipeline(function: FunctionSource) -> BatchResult:
+            test_file = test_file_for(function)
+            try:
+                await generator.generate_tests_async(
+                    test_file, functions=[function], limiter=limiter
+                )
+                result = await loop.run_in_executor(
+                    pool,
+                    _validate_and_mutate,
+                    function,
+                    test_file,
+                    cache_dir,
+                    max_iterations,
+                    pruner,
+                    schemata,
+                    execution,
+                    report_dir,
+                    feedback_iterations,
+                    generator.backend,
+                    quiet_tests,
+                    sampler,
+                )
+            except Exception as e:
+                logging.error(f"Pipeline for {function.qualname} in {function.file} failed: {e}")
+                result = BatchResult(function, test_file, error=str(e))
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        return list(await asyncio.gather(*(pipeline(function) for function in functions)))
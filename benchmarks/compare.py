@@ -0,0 +1,70 @@
+import argparse
+import json
+import sys
+
+DEFAULT_THRESHOLD = 0.2
+# differences below this many seconds are noise, whatever the ratio
+MIN_DIFFERENCE = 0.05
+
+
+def compare(
+    baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD
+) -> list[str]:
+    """
+    Returns a line for every stage of every target whose wall time grew by more than
+    `threshold` (a fraction) compared to `baseline`, or whose throughput dropped by
+    as much. Targets or stages missing from either run are ignored.
+    """
+    regressions = []
+    for target, current_target in current.get("targets", {}).items():
+        baseline_target = baseline.get("targets", {}).get(target)
+        if baseline_target is None:
+            continue
+        for stage, now in current_target["stages"].items():
+            before = baseline_target["stages"].get(stage)
+            if before is None:
+                continue
+            slower = now["wall_time"] - before["wall_time"]
+            if slower > MIN_DIFFERENCE and now["wall_time"] > before["wall_time"] * (1 + threshold):
+                regressions.append(
+                    f"{target}/{stage}: wall time {before['wall_time']:.3f}s -> "
+                    f"{now['wall_time']:.3f}s (+{slower / before['wall_time']:.0%})"
+                )
+            elif (
+                before["items_per_second"] > 0
+                and slower > MIN_DIFFERENCE
+                and now["items_per_second"] < before["items_per_second"] * (1 - threshold)
+            ):
+                regressions.append(
+                    f"{target}/{stage}: {before['items_per_second']:.1f}/s -> "
+                    f"{now['items_per_second']:.1f}/s"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two pymnt benchmark results")
+    parser.add_argument("baseline", help="JSON written by an earlier benchmark run")
+    parser.add_argument("current", help="JSON written by the run to check")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed slowdown as a fraction (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    with open(args.baseline, "r") as file:
+        baseline = json.load(file)
+    with open(args.current, "r") as file:
+        current = json.load(file)
+    regressions = compare(baseline, current, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import inspect
+import itertools
+import textwrap
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+from llm_backend import LLMBackend
+
+# arguments the generated tests call the functions with, killing tests use the second pool
+GENERATION_INPUTS = [0, 1, 2, 3, 5, -1]
+KILLING_INPUTS = [4, 6, 7, 10, -2, 20]
+TESTS_PER_FUNCTION = 6
+# characters per streamed chunk, roughly a few tokens like a real server sends
+CHUNK_SIZE = 16
+
+
+class FakeLLM(LLMBackend):
+    """
+    Deterministic stand-in for the LLM backend, so benchmarks need no network and
+    every run sees the same tests. Generated tests call the real function with
+    fixed inputs and assert whatever it returns (or raises), so they always pass
+    on the unmutated code.
+    """
+
+    def __init__(self, functions: list[Callable[..., Any]]) -> None:
+        self._functions = functions
+        self._sources = {function: inspect.getsource(function) for function in functions}
+        self.requests = 0
+        self.model = "fake"
+
+    def complete(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Optional[str]:
+        self.requests += 1
+        if "JSON" in system_prompt:
+            return '{"results": []}'
+        if "mutated versions" in user_prompt:
+            return self._tests_for(user_prompt, KILLING_INPUTS, "killing", indent_first=True)
+        if "Failing Test" in user_prompt or "failing unit test" in user_prompt.lower():
+            return "UNKNOWN"
+        return self._tests_for(user_prompt, GENERATION_INPUTS, "case", indent_first=False)
+
+    async def complete_async(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Optional[str]:
+        return self.complete(system_prompt, user_prompt, max_tokens, temperature)
+
+    def stream(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Iterator[str]:
+        content = self.complete(system_prompt, user_prompt, max_tokens, temperature) or ""
+        for start in range(0, len(content), CHUNK_SIZE):
+            yield content[start : start + CHUNK_SIZE]
+
+    async def stream_async(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> AsyncIterator[str]:
+        for chunk in self.stream(system_prompt, user_prompt, max_tokens, temperature):
+            yield chunk
+
+    def _tests_for(self, prompt: str, inputs: list[int], prefix: str, indent_first: bool) -> str:
+        matches = [function for function, source in self._sources.items() if source in prompt]
+        if not matches:
+            return "def test_nothing(self):\n    self.assertTrue(True)"
+        function = max(matches, key=lambda function: len(self._sources[function]))
+
+        arity = len(inspect.signature(function).parameters)
+        combinations = list(itertools.product(inputs, repeat=arity))
+        step = max(1, len(combinations) // TESTS_PER_FUNCTION)
+        methods = [
+            _test_method(function, f"test_{function.__name__}_{prefix}_{index}", arguments)
+            for index, arguments in enumerate(combinations[::step][:TESTS_PER_FUNCTION])
+        ]
+        content = "\n\n".join(methods)
+        if indent_first:
+            return content
+        # the generator puts the first line of the response after an indented class header
+        return textwrap.indent(content, "    ")[4:]
+
+
+def _test_method(function: Callable[..., Any], name: str, arguments: tuple) -> str:
+    call = f"{function.__name__}({', '.join(map(repr, arguments))})"
+    try:
+        expected = function(*arguments)
+    except Exception as error:
+        body = f"with self.assertRaises({type(error).__name__}):\n        {call}"
+    else:
+        if _round_trips(expected):
+            body = f"self.assertEqual({call}, {expected!r})"
+        else:
+            body = call
+    return f"def {name}(self):\n    {body}"
+
+
+def _round_trips(value: Any) -> bool:
+    try:
+        return eval(repr(value)) == value
+    except Exception:
+        return False
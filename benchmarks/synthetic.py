@@ -0,0 +1,56 @@
+import random
+
+# every template takes int arguments and stays fast for any of the fake LLM's inputs
+_TEMPLATES = [
+    '''
+def {name}(a, b):
+    if a > {c1}:
+        return a * {c2} - b
+    return a + b + {c3}
+''',
+    '''
+def {name}(n):
+    total = 0
+    for k in range(min(abs(n), {c1})):
+        if k % {c2} == 0 or k > {c3}:
+            total += k
+    return total
+''',
+    '''
+def {name}(x, y):
+    if x < 0 and y < 0:
+        raise ValueError("both negative")
+    return (x - y) // {c1} if x >= y else (y - x) % {c2}
+''',
+    '''
+def {name}(n):
+    return n % {c2} == 0 and not n < {c3}
+''',
+    '''
+def {name}(a, b):
+    result = {c3}
+    while a > 0 and result < {c1} * 10:
+        result += b * {c2}
+        a -= 1
+    return result
+''',
+]
+
+SIZES = {"small": 20, "medium": 100, "large": 400}
+
+
+def synthetic_module(functions: int, seed: int = 0) -> str:
+    """Source of a module with `functions` deterministic functions built from templates."""
+    rng = random.Random(seed)
+    parts = ['"""Synthetic module generated for benchmarks."""\n']
+    for index in range(functions):
+        template = _TEMPLATES[index % len(_TEMPLATES)]
+        parts.append(
+            template.format(
+                name=f"function_{index}",
+                c1=rng.randint(1, 9),
+                c2=rng.randint(2, 9),
+                c3=rng.randint(0, 9),
+            )
+        )
+    return "\n".join(parts)
@@ -0,0 +1,121 @@
+import ast
+import glob
+import logging
+import os
+import inspect
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Optional, Union
+
+
+@dataclass(frozen=True)
+class FunctionSource:
+    """
+    A function or method found by parsing a file, without importing or executing it.
+    """
+
+    file: str
+    module: str  # module name relative to the file's directory, i.e. the file stem
+    qualname: str  # "function" or "Class.method"
+    lineno: int
+    source: str
+
+    @property
+    def name(self) -> str:
+        return self.qualname.rsplit(".", 1)[-1]
+
+    @property
+    def import_name(self) -> str:
+        """The top-level name a test has to import to reach this function."""
+        return self.qualname.split(".", 1)[0]
+
+    @classmethod
+    def from_callable(cls, function: Callable[..., Any]) -> "FunctionSource":
+        file = inspect.getsourcefile(function) or "<unknown>"
+        return cls(
+            file=file,
+            # the test file sits next to the module and imports it relatively by its stem
+            module=function.__module__.rsplit(".", 1)[-1],
+            qualname=function.__qualname__,
+            lineno=function.__code__.co_firstlineno,
+            source=inspect.getsource(function),
+        )
+
+
+FunctionLike = Union[Callable[..., Any], FunctionSource]
+
+
+def describe_function(function: FunctionLike) -> FunctionSource:
+    if isinstance(function, FunctionSource):
+        return function
+    return FunctionSource.from_callable(function)
+
+
+def discover_files(paths: Iterable[str]) -> list[str]:
+    """
+    Expand packages/directories (recursively) and glob patterns into Python source files.
+    Test files are left out, they are what pymnt generates.
+    """
+    files: list[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = glob.glob(os.path.join(path, "**", "*.py"), recursive=True)
+        else:
+            matches = glob.glob(path, recursive=True)
+        for match in sorted(matches):
+            name = os.path.basename(match)
+            if name.endswith("_test.py") or name.startswith("test_"):
+                continue
+            if match not in files:
+                files.append(match)
+    return files
+
+
+def discover_functions(paths: Iterable[str]) -> list[FunctionSource]:
+    """
+    Find all top-level functions and methods of top-level classes in the given
+    files, packages or glob patterns by parsing them with `ast`.
+    """
+    functions: list[FunctionSource] = []
+    for file in discover_files(paths):
+        try:
+            functions.extend(functions_in_file(file))
+        except (OSError, SyntaxError) as e:
+            logging.warning(f"Skipping {file}: {e}")
+    return functions
+
+
+def functions_in_file(file: str) -> list[FunctionSource]:
+    with open(file, "r") as f:
+        source = f.read()
+    tree = ast.parse(source, file)
+    module = os.path.splitext(os.path.basename(file))[0]
+
+    def describe(node: ast.AST, qualname: str) -> FunctionSource:
+        # include decorators, they are part of what the function does
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        lines = source.splitlines(keepends=True)[start - 1 : node.end_lineno]
+        return FunctionSource(file, module, qualname, node.lineno, "".join(lines))
+
+    functions = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.append(describe(node, node.name))
+        elif isinstance(node, ast.ClassDef):
+            for member in node.body:
+                if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    if member.name.startswith("__") and member.name.endswith("__"):
+                        continue
+                    functions.append(describe(member, f"{node.name}.{member.name}"))
+    return functions
+
+
+def function_by_name(file: str, qualname: str) -> Optional[FunctionSource]:
+    """
+    The function or method ("Class.method") `qualname` of `file`, found by parsing
+    it with `ast`. None if the parser cannot see it, e.g. because it is created
+    when the module runs.
+    """
+    for function in functions_in_file(file):
+        if function.qualname == qualname:
+            return function
+    return None
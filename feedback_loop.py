@@ -0,0 +1,205 @@
+import ast
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from discovery import FunctionSource, functions_in_file
+from fix_applier import FixApplier
+from llm_backend import MissingRecordingError
+from mutation_tester import ASTMutationRunner, MutantResult, MutationReport, MutationStatus
+from test_generator import OpenAITestGenerator, test_class_name
+from unit_tests import UnitTests
+
+MAX_FEEDBACK_ITERATIONS = 3
+
+
+@dataclass
+class FeedbackIteration:
+    iteration: int
+    survivors: int
+    added_tests: list[str] = field(default_factory=list)
+    # added tests dropped because they fail on the unmutated code
+    rejected_tests: list[str] = field(default_factory=list)
+    newly_killed: int = 0
+    score: float = 0.0
+
+
+def digest_survivors(results: list[MutantResult], source: str) -> str:
+    """
+    Compact description of the surviving mutants of one function, grouped by line:
+
+        line 12: `if n < 0:`
+          - < -> <=
+          - 0 -> 1 (no test reaches this line)
+    """
+    lines = source.splitlines()
+    by_line: dict[int, list[MutantResult]] = {}
+    for result in results:
+        by_line.setdefault(result.mutant.line, []).append(result)
+
+    digest = []
+    for line, line_results in sorted(by_line.items()):
+        code = lines[line - 1].strip() if 0 < line <= len(lines) else ""
+        digest.append(f"line {line}: `{code}`")
+        for result in line_results:
+            uncovered = result.status == MutationStatus.UNCOVERED
+            note = " (no test reaches this line)" if uncovered else ""
+            digest.append(f"  - {result.mutant.description}{note}")
+    return "\n".join(digest)
+
+
+def close_gaps(
+    test_generator: OpenAITestGenerator,
+    mutation_runner: ASTMutationRunner,
+    unit_test_runner: UnitTests,
+    target_file: str,
+    test_file: str,
+    report: MutationReport,
+    max_iterations: int = MAX_FEEDBACK_ITERATIONS,
+    on_iteration: Optional[Callable[[FeedbackIteration], None]] = None,
+    on_result: Optional[Callable[[MutantResult], None]] = None,
+) -> MutationReport:
+    """
+    Feeds the surviving mutants of `report` back to the generator, one digest per
+    function, and appends the tests it comes up with to the test classes in
+    `test_file`. Only the survivors are then re-run, and only against the new tests.
+    Stops once an iteration kills no further mutant or nothing survives.
+    Returns `report` with the results of newly killed mutants replaced.
+    `on_result` gets every result that replaces one in `report`, as it comes in.
+    """
+    start = time.perf_counter()
+    functions = {function.qualname: function for function in functions_in_file(target_file)}
+    results = {result.mutant.id: result for result in report.results}
+
+    for iteration in range(1, max_iterations + 1):
+        # stillborn mutants do not compile, no test can kill them
+        survivors = [
+            result
+            for result in results.values()
+            if not result.killed and result.status != MutationStatus.STILLBORN
+        ]
+        if not survivors:
+            break
+        progress = FeedbackIteration(iteration, len(survivors))
+
+        added = _add_killing_tests(test_generator, test_file, functions, survivors)
+        new_tests = [
+            test for test in unit_test_runner.load_tests(test_file) if _qualname(test) in added
+        ]
+        failing = _failing_on_original(unit_test_runner, new_tests)
+        if failing:
+            # a test failing without any mutation would kill every mutant it reaches
+            FixApplier.remove_tests(failing)
+            progress.rejected_tests = [test.id() for test in failing]
+        new_tests = [test for test in new_tests if test not in failing]
+        progress.added_tests = [test.id() for test in new_tests]
+        if not new_tests:
+            _report(progress, results, on_iteration)
+            break
+
+        def collect(result: MutantResult) -> None:
+            previous = results[result.mutant.id]
+            # a mutant the new tests reach but do not kill was only uncovered before
+            if result.killed or (
+                previous.status == MutationStatus.UNCOVERED
+                and result.status != MutationStatus.UNCOVERED
+            ):
+                results[result.mutant.id] = result
+                progress.newly_killed += result.killed
+                if on_result is not None:
+                    on_result(result)
+
+        mutation_runner.run(
+            collect,
+            mutant_ids=[result.mutant.id for result in survivors],
+            test_ids=progress.added_tests,
+        )
+        _report(progress, results, on_iteration)
+        if progress.newly_killed == 0:
+            break
+
+    return MutationReport(
+        target=report.target,
+        results=sorted(results.values(), key=lambda result: result.mutant.id),
+        duration=report.duration + time.perf_counter() - start,
+        pruned=report.pruned,
+        sample=report.sample,
+    )
+
+
+def _add_killing_tests(
+    test_generator: OpenAITestGenerator,
+    test_file: str,
+    functions: dict[str, FunctionSource],
+    survivors: list[MutantResult],
+) -> set[str]:
+    """Returns the added test methods as `<class>.<method>`."""
+    with open(test_file, "r") as file:
+        tree = ast.parse(file.read(), test_file)
+    test_classes = {
+        node.name: [
+            member.name for member in node.body if isinstance(member, ast.FunctionDef)
+        ]
+        for node in tree.body
+        if isinstance(node, ast.ClassDef)
+    }
+
+    by_function: dict[str, list[MutantResult]] = {}
+    for result in survivors:
+        by_function.setdefault(result.mutant.function, []).append(result)
+
+    added: set[str] = set()
+    for qualname, function_survivors in by_function.items():
+        function = functions.get(qualname)
+        if function is None:
+            continue
+        class_name = test_class_name(function)
+        if class_name not in test_classes:
+            # the tests in this file were not generated for this function
+            logging.debug(f"No {class_name} in {test_file}, skipping {qualname}")
+            continue
+        digest = digest_survivors(function_survivors, _file_source(function))
+        try:
+            methods = test_generator.generate_killing_tests(
+                function, digest, test_classes[class_name]
+            )
+        except MissingRecordingError as e:
+            # replayed runs keep the mutation report, the function just gets no new tests
+            logging.warning(f"No killing tests for {qualname}: {e}")
+            continue
+        if methods is None:
+            continue
+        added.update(
+            f"{class_name}.{name}"
+            for name in FixApplier.add_test_methods(test_file, class_name, methods)
+        )
+    return added
+
+
+def _failing_on_original(unit_test_runner: UnitTests, tests: list) -> list:
+    if not tests:
+        return []
+    result = unit_test_runner.run_selected(tests)
+    return [test for test, _ in result.failures + result.errors]
+
+
+def _report(progress: FeedbackIteration, results: dict, on_iteration) -> None:
+    scored = [result for result in results.values() if result.status != MutationStatus.STILLBORN]
+    killed = sum(1 for result in scored if result.killed)
+    progress.score = killed / len(scored) if scored else 0.0
+    logging.info(
+        f"Feedback iteration {progress.iteration}: {len(progress.added_tests)} tests added, "
+        f"{progress.newly_killed}/{progress.survivors} surviving mutants killed, "
+        f"score {progress.score:.1%}"
+    )
+    if on_iteration is not None:
+        on_iteration(progress)
+
+
+def _qualname(test) -> str:
+    return f"{type(test).__name__}.{test._testMethodName}"
+
+
+def _file_source(function: FunctionSource) -> str:
+    with open(function.file, "r") as file:
+        return file.read()
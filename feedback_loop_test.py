@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+from discovery import functions_in_file
+from feedback_loop import close_gaps
+from llm_backend import RecordReplayBackend
+from mutation_tester import ASTMutationRunner
+from test_generator import OpenAITestGenerator
+from unit_tests import UnitTests
+
+TARGET = """
+def sign(x):
+    return "pos" if x > 0 else "neg"
+"""
+
+TESTS = """
+import unittest
+from .target import sign
+
+
+class TestSign(unittest.TestCase):
+    def test_sign(self):
+        self.assertEqual(sign(5), "pos")
+        self.assertEqual(sign(-5), "neg")
+"""
+
+
+class CloseGapsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        package = os.path.join(directory.name, "gappkg")
+        os.mkdir(package)
+        for name, source in [("__init__", ""), ("target", TARGET), ("target_test", TESTS)]:
+            with open(os.path.join(package, f"{name}.py"), "w") as file:
+                file.write(textwrap.dedent(source))
+        # the runners take paths relative to the working directory, like the CLI
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        sys.path.insert(0, directory.name)
+        self.addCleanup(sys.path.remove, directory.name)
+
+    def test_missing_recording_keeps_the_report(self):
+        target_file, test_file = "gappkg/target.py", "gappkg/target_test.py"
+        runner = ASTMutationRunner(target_file, test_file, jobs=1, cache_dir=None)
+        report = runner.run()
+        self.assertTrue(report.survived)
+        generator = OpenAITestGenerator(
+            functions=functions_in_file(target_file), backend=RecordReplayBackend("recordings")
+        )
+        with self.assertLogs(level="WARNING") as logs:
+            final = close_gaps(
+                generator, runner, UnitTests(quiet=True), target_file, test_file, report
+            )
+        self.assertIn("No recorded response", "\n".join(logs.output))
+        self.assertEqual(final.score, report.score)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,11 @@
+import ast
 import logging
 import inspect
+import os
+import tempfile
+import textwrap
 import unittest
+from typing import Any
 
 
 class FixApplier:
@@ -11,38 +16,179 @@ class FixApplier:
         """
         Apply the suggested test fix by replacing the specific test method in the test case.
         """
-        try:
-            source_file = inspect.getsourcefile(test_case.__class__)
+        self.apply_test_fixes({test_case: self._suggested_fix})
+
+    @classmethod
+    def apply_test_fixes(cls, fixes: dict[unittest.TestCase, str]) -> list[unittest.TestCase]:
+        """
+        Apply many test fixes at once. Every test file is parsed once, the methods are
+        located by their AST node spans and all replacements are spliced in from the
+        bottom up, so earlier edits cannot shift the lines of later ones. A fix that does
+        not compile, on its own or in place of its method, is skipped, and the file is
+        written once, atomically.
+        Returns the tests whose fix was applied.
+        """
+        fixes_by_file: dict[str, dict[unittest.TestCase, str]] = {}
+        for test_case, fix in fixes.items():
+            try:
+                source_file = inspect.getsourcefile(test_case.__class__)
+            except TypeError:
+                source_file = None
             if source_file is None:
                 logging.error(f"Could not find source file for {test_case.__class__}")
-                return
+                continue
+            fixes_by_file.setdefault(source_file, {})[test_case] = fix
 
-            test_method_name = test_case._testMethodName
-            test_method = getattr(test_case.__class__, test_method_name)
+        applied = []
+        for source_file, file_fixes in fixes_by_file.items():
+            try:
+                applied.extend(cls._apply_to_file(source_file, file_fixes))
+            except (OSError, SyntaxError) as e:
+                logging.error(f"Error applying test fixes to {source_file}: {e}")
+        return applied
 
-            lines, method_start = inspect.getsourcelines(test_method)
-            method_end = method_start + len(lines) - 1
+    @classmethod
+    def _apply_to_file(
+        cls, source_file: str, fixes: dict[unittest.TestCase, str]
+    ) -> list[unittest.TestCase]:
+        with open(source_file, "r") as file:
+            source = file.read()
+        tree = ast.parse(source, source_file)
+        all_lines = source.splitlines(keepends=True)
 
-            # could make it better by seeing what indentation the method is at and using that
-            indented_fix = "    " + self._suggested_fix.replace("\n", "\n    ")
+        # (first line, last line, replacement lines, test)
+        edits: list[tuple[int, int, list[str], unittest.TestCase]] = []
+        for test_case, fix in fixes.items():
+            method = find_test_method(
+                tree, test_case.__class__.__name__, test_case._testMethodName
+            )
+            if method is None:
+                logging.error(f"Could not find {test_case.id()} in {source_file}")
+                continue
+            replacement = textwrap.dedent(fix).strip("\n")
+            try:
+                compile(replacement, f"<fix for {test_case.id()}>", "exec")
+            except SyntaxError as e:
+                logging.error(f"Suggested fix for {test_case.id()} does not compile: {e}")
+                continue
+            first_line = min(
+                [method.lineno] + [decorator.lineno for decorator in method.decorator_list]
+            )
+            def_line = all_lines[first_line - 1]
+            indentation = def_line[: len(def_line) - len(def_line.lstrip())]
+            edits.append(
+                (
+                    first_line,
+                    method.end_lineno,
+                    textwrap.indent(replacement + "\n", indentation).splitlines(keepends=True),
+                    test_case,
+                )
+            )
 
-            with open(source_file, "r") as file:
-                all_lines = file.readlines()
+        valid = edits
+        new_source = _splice(all_lines, edits)
+        try:
+            compile(new_source, source_file, "exec")
+        except SyntaxError:
+            # the fixes compiled on their own, so some do not fit their class. Find them
+            # one by one, rather than losing the others too
+            valid = []
+            for edit in edits:
+                try:
+                    compile(_splice(all_lines, [edit]), source_file, "exec")
+                except SyntaxError as e:
+                    logging.error(f"Suggested fix for {edit[3].id()} does not fit: {e}")
+                    continue
+                valid.append(edit)
+            if not valid:
+                return []
+            new_source = _splice(all_lines, valid)
+            compile(new_source, source_file, "exec")
+        _write_atomically(source_file, new_source)
 
-            new_lines = (
-                all_lines[: method_start - 1]  # lines before the method
-                + [indented_fix + "\n"]  # new implementation
-                + all_lines[method_end:]  # lines after the method
-            )
+        logging.info(f"Applied {len(valid)} test fixes to {source_file}.")
+        return [test_case for _, _, _, test_case in valid]
+
+    @classmethod
+    def add_test_methods(cls, source_file: str, class_name: str, methods: str) -> list[str]:
+        """
+        Append the test methods in `methods` to `class_name` in one atomic write. Methods
+        clashing with an existing name get a numbered suffix, anything in `methods`
+        other than test methods is dropped. Returns the names of the added methods.
+        """
+        try:
+            new_tree = ast.parse(textwrap.dedent(methods).strip("\n"))
+        except SyntaxError as e:
+            logging.error(f"Generated tests for {class_name} do not compile: {e}")
+            return []
 
-            with open(source_file, "w") as file:
-                file.writelines(new_lines)
+        with open(source_file, "r") as file:
+            source = file.read()
+        tree = ast.parse(source, source_file)
+        class_node = next(
+            (
+                node
+                for node in tree.body
+                if isinstance(node, ast.ClassDef) and node.name == class_name
+            ),
+            None,
+        )
+        if class_node is None:
+            logging.error(f"Could not find {class_name} in {source_file}")
+            return []
 
-            logging.info(
-                f"Test fix applied successfully to method {test_method_name} in {test_case.__class__.__name__} ({source_file})."
+        names = {
+            member.name
+            for member in class_node.body
+            if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef))
+        }
+        all_lines = source.splitlines(keepends=True)
+        first_member = all_lines[class_node.body[0].lineno - 1]
+        indentation = first_member[: len(first_member) - len(first_member.lstrip())]
+
+        added = []
+        new_lines = []
+        for node in new_tree.body:
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            if not node.name.startswith("test"):
+                continue
+            name = node.name
+            suffix = 1
+            while name in names:
+                suffix += 1
+                name = f"{node.name}_{suffix}"
+            node.name = name
+            names.add(name)
+            added.append(name)
+            new_lines.append("\n")
+            new_lines.extend(
+                textwrap.indent(ast.unparse(node) + "\n", indentation).splitlines(keepends=True)
             )
-        except Exception as e:
-            logging.error(f"Error applying test fix: {e}")
+        if not added:
+            return []
+
+        end = class_node.end_lineno
+        if not all_lines[end - 1].endswith("\n"):
+            all_lines[end - 1] += "\n"
+        all_lines[end:end] = new_lines
+        new_source = "".join(all_lines)
+        try:
+            compile(new_source, source_file, "exec")
+        except SyntaxError as e:
+            logging.error(f"Adding tests to {class_name} would break {source_file}: {e}")
+            return []
+        _write_atomically(source_file, new_source)
+
+        logging.info(f"Added {len(added)} tests to {class_name} in {source_file}.")
+        return added
+
+    @classmethod
+    def remove_tests(cls, tests: list[unittest.TestCase]) -> list[unittest.TestCase]:
+        """
+        Remove the given test methods from their files. Returns the removed tests.
+        """
+        return cls.apply_test_fixes({test: "" for test in tests})
 
     @property
     def suggested_fix(self):
@@ -51,3 +197,42 @@ class FixApplier:
     @suggested_fix.setter
     def suggested_fix(self, new_suggested_fix: str):
         self._suggested_fix = new_suggested_fix
+
+
+def find_test_method(tree: ast.Module, class_name: str, method_name: str):
+    """
+    Find the definition of `class_name.method_name` among the top-level classes of `tree`.
+    """
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == class_name:
+            for member in node.body:
+                if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)) and (
+                    member.name == method_name
+                ):
+                    return member
+    return None
+
+
+def _splice(lines: list[str], edits: list[tuple[int, int, list[str], Any]]) -> str:
+    """Source with the (first line, last line, replacement lines) of every edit replaced."""
+    lines = list(lines)
+    for start, end, replacement, _ in sorted(edits, key=lambda edit: edit[0], reverse=True):
+        lines[start - 1 : end] = replacement
+    return "".join(lines)
+
+
+def _write_atomically(path: str, content: str) -> None:
+    """
+    Write to a temporary file next to `path` and rename it over `path`, so a crash
+    mid-write never leaves a truncated test file behind.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "w") as file:
+            file.write(content)
+        os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
@@ -0,0 +1,69 @@
+import importlib
+import os
+import sys
+import tempfile
+import unittest
+from fix_applier import FixApplier
+
+TESTS = """import unittest
+
+
+class TestF(unittest.TestCase):
+    def test_a(self):
+        self.assertEqual(1, 2)
+
+    def test_b(self):
+        self.assertEqual(3, 4)
+"""
+
+
+class ApplyTestFixesTest(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "fix_target_test.py")
+        with open(self.path, "w") as file:
+            file.write(TESTS)
+        sys.path.insert(0, directory.name)
+        self.addCleanup(sys.path.remove, directory.name)
+        self.addCleanup(sys.modules.pop, "fix_target_test", None)
+        self.cls = importlib.import_module("fix_target_test").TestF
+
+    def source(self) -> str:
+        with open(self.path) as file:
+            return file.read()
+
+    def test_fixes_are_spliced_in(self):
+        applied = FixApplier.apply_test_fixes(
+            {
+                self.cls("test_a"): "def test_a(self):\n    self.assertEqual(1, 1)",
+                self.cls("test_b"): "def test_b(self):\n    self.assertEqual(4, 4)",
+            }
+        )
+        self.assertEqual(len(applied), 2)
+        self.assertIn("self.assertEqual(1, 1)", self.source())
+        self.assertIn("self.assertEqual(4, 4)", self.source())
+
+    def test_fix_that_only_compiles_on_its_own_does_not_block_the_others(self):
+        # a future import compiles at the top of a file, not inside a class
+        broken = "from __future__ import annotations\ndef test_b(self):\n    pass"
+        with self.assertLogs(level="ERROR"):
+            applied = FixApplier.apply_test_fixes(
+                {
+                    self.cls("test_a"): "def test_a(self):\n    self.assertEqual(1, 1)",
+                    self.cls("test_b"): broken,
+                }
+            )
+        self.assertEqual([test._testMethodName for test in applied], ["test_a"])
+        self.assertIn("self.assertEqual(1, 1)", self.source())
+        self.assertIn("self.assertEqual(3, 4)", self.source())
+
+    def test_fix_that_does_not_compile_is_skipped(self):
+        with self.assertLogs(level="ERROR"):
+            applied = FixApplier.apply_test_fixes({self.cls("test_a"): "def test_a(self:"})
+        self.assertEqual(applied, [])
+        self.assertEqual(self.source(), TESTS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import sys
+import unittest
+from typing import Callable, Iterable, Optional
+from unit_tests import TimedTestResult
+
+
+class CoverageIndex:
+    """
+    Maps executed (file, line) pairs to the IDs of the tests that executed them.
+    """
+
+    def __init__(self) -> None:
+        self._lines: dict[tuple[str, int], set[str]] = {}
+
+    def add(self, file: str, line: int, test_id: str) -> None:
+        self._lines.setdefault((file, line), set()).add(test_id)
+
+    def tests_for(self, file: str, *lines: int) -> set[str]:
+        test_ids: set[str] = set()
+        for line in lines:
+            test_ids |= self._lines.get((file, line), set())
+        return test_ids
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+
+def run_with_coverage(
+    tests: Iterable[unittest.TestCase], files: set[str]
+) -> tuple[TimedTestResult, CoverageIndex]:
+    """
+    Runs the tests once while tracing which lines of `files` each of them executes.
+    Uses `sys.monitoring` where available (3.12+) and falls back to `sys.settrace`.
+    """
+    index = CoverageIndex()
+    result = _CoverageResult()
+
+    def record(file: str, line: int) -> None:
+        # lines run by class/module fixtures belong to no test in particular
+        if result.current_test is not None:
+            index.add(file, line, result.current_test)
+
+    with _line_tracer(files, record):
+        unittest.TestSuite(tests).run(result)
+    return result, index
+
+
+class _CoverageResult(TimedTestResult):
+    """
+    Keeps track of which test is running so traced lines can be attributed to it.
+    """
+
+    current_test: Optional[str] = None
+
+    def startTest(self, test: unittest.TestCase) -> None:
+        super().startTest(test)
+        self.current_test = test.id()
+
+    def stopTest(self, test: unittest.TestCase) -> None:
+        self.current_test = None
+        super().stopTest(test)
+
+
+class _line_tracer:
+    def __init__(self, files: set[str], record: Callable[[str, int], None]) -> None:
+        self._files = files
+        self._record = record
+        self._monitoring_tool: Optional[int] = None
+        self._previous_trace = None
+
+    def __enter__(self) -> "_line_tracer":
+        monitoring = getattr(sys, "monitoring", None)
+        if monitoring is not None:
+            try:
+                monitoring.use_tool_id(monitoring.COVERAGE_ID, "pymnt")
+            except ValueError:
+                # another coverage tool is active, settrace still works alongside it
+                monitoring = None
+        if monitoring is not None:
+            self._monitoring_tool = monitoring.COVERAGE_ID
+            monitoring.register_callback(
+                self._monitoring_tool, monitoring.events.LINE, self._on_line
+            )
+            monitoring.set_events(self._monitoring_tool, monitoring.events.LINE)
+        else:
+            self._previous_trace = sys.gettrace()
+            sys.settrace(self._global_trace)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._monitoring_tool is not None:
+            monitoring = sys.monitoring
+            monitoring.set_events(self._monitoring_tool, 0)
+            monitoring.register_callback(self._monitoring_tool, monitoring.events.LINE, None)
+            monitoring.free_tool_id(self._monitoring_tool)
+            monitoring.restart_events()
+        else:
+            sys.settrace(self._previous_trace)
+
+    def _on_line(self, code, line):
+        if code.co_filename in self._files:
+            self._record(code.co_filename, line)
+            return None
+        return sys.monitoring.DISABLE
+
+    def _global_trace(self, frame, event, arg):
+        if frame.f_code.co_filename in self._files:
+            return self._local_trace
+        return None
+
+    def _local_trace(self, frame, event, arg):
+        if event == "line":
+            self._record(frame.f_code.co_filename, frame.f_lineno)
+        return self._local_trace
@@ -0,0 +1,329 @@
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Any, AsyncIterator, Iterator, Optional
+from llm_cache import cache_key
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+
+class BackendKind(Enum):
+    OPENAI = "openai"
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+class MissingRecordingError(LookupError):
+    """A replayed request has no recorded response."""
+
+
+class LLMBackend(ABC):
+    """
+    Defines an interface for chat completion backends.
+    """
+
+    model: str
+
+    @property
+    def cache_namespace(self) -> str:
+        """What responses are cached under, so different servers never share them."""
+        return self.model
+
+    @abstractmethod
+    def complete(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    async def complete_async(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Optional[str]:
+        pass
+
+    def stream(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Iterator[str]:
+        """
+        Yields the completion in chunks as they arrive. Closing the iterator early
+        abandons the request. Backends that cannot stream yield it in one piece.
+        """
+        content = self.complete(system_prompt, user_prompt, max_tokens, temperature)
+        if content is not None:
+            yield content
+
+    async def stream_async(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> AsyncIterator[str]:
+        content = await self.complete_async(system_prompt, user_prompt, max_tokens, temperature)
+        if content is not None:
+            yield content
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    Any server speaking the OpenAI chat completions API: OpenAI itself, or a
+    self-hosted model behind `base_url` (vLLM, llama.cpp, Ollama, ...).
+    The clients are created on the first request, so importing and constructing
+    it needs neither the openai package nor an API key.
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+    ) -> None:
+        self.model = model
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        self._client: Any = None
+        self._async_client: Any = None
+
+    @property
+    def cache_namespace(self) -> str:
+        return _namespace(self.model, self.base_url)
+
+    def _client_arguments(self) -> dict[str, Any]:
+        if not self.api_key and not self.base_url:
+            raise ValueError("OPENAI_API_KEY environment variable is not set")
+        # local servers usually ignore the key, but the client insists on one
+        return {"api_key": self.api_key or "not-needed", "base_url": self.base_url}
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            arguments = self._client_arguments()
+            from openai import OpenAI
+
+            self._client = OpenAI(**arguments)
+        return self._client
+
+    @property
+    def async_client(self) -> Any:
+        if self._async_client is None:
+            arguments = self._client_arguments()
+            from openai import AsyncOpenAI
+
+            # retries are done by retry_with_backoff so they respect the rate limits
+            self._async_client = AsyncOpenAI(**arguments, max_retries=0)
+        return self._async_client
+
+    def _request(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+
+    def complete(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Optional[str]:
+        response = self.client.chat.completions.create(
+            **self._request(system_prompt, user_prompt, max_tokens, temperature)
+        )
+        return response.choices[0].message.content
+
+    async def complete_async(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Optional[str]:
+        response = await self.async_client.chat.completions.create(
+            **self._request(system_prompt, user_prompt, max_tokens, temperature)
+        )
+        return response.choices[0].message.content
+
+    def stream(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Iterator[str]:
+        response = self.client.chat.completions.create(
+            **self._request(system_prompt, user_prompt, max_tokens, temperature), stream=True
+        )
+        try:
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # dropping the connection stops the generation, and the token spend
+            response.close()
+
+    async def stream_async(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> AsyncIterator[str]:
+        response = await self.async_client.chat.completions.create(
+            **self._request(system_prompt, user_prompt, max_tokens, temperature), stream=True
+        )
+        try:
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await response.close()
+
+    def __getstate__(self) -> dict[str, Any]:
+        # batch mode ships the backend to pool workers, the clients hold sockets
+        return {**self.__dict__, "_client": None, "_async_client": None}
+
+
+class RecordReplayBackend(LLMBackend):
+    """
+    Serves responses recorded in `directory`, one JSON file per request with the
+    prompts next to the response, so recordings can be reviewed and checked in.
+    With an `inner` backend, requests missing from the recordings are sent to it
+    and recorded. Without one (replay), they raise MissingRecordingError, so CI
+    runs fully offline and notices prompts that changed.
+    Unlike the response cache, recordings never expire and are never evicted.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        inner: Optional[LLMBackend] = None,
+        model: str = DEFAULT_MODEL,
+        base_url: Optional[str] = None,
+    ) -> None:
+        self.directory = directory
+        self.inner = inner
+        self.model = inner.model if inner is not None else model
+        self.base_url = base_url
+
+    @property
+    def cache_namespace(self) -> str:
+        if self.inner is not None:
+            return self.inner.cache_namespace
+        return _namespace(self.model, self.base_url)
+
+    def complete(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Optional[str]:
+        path = self._path(system_prompt, user_prompt, max_tokens, temperature)
+        recorded = self._load(path)
+        if recorded is not None or self.inner is None:
+            return self._replay(path, recorded)
+        content = self.inner.complete(system_prompt, user_prompt, max_tokens, temperature)
+        self._record(path, system_prompt, user_prompt, max_tokens, temperature, content)
+        return content
+
+    async def complete_async(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Optional[str]:
+        path = self._path(system_prompt, user_prompt, max_tokens, temperature)
+        recorded = self._load(path)
+        if recorded is not None or self.inner is None:
+            return self._replay(path, recorded)
+        content = await self.inner.complete_async(
+            system_prompt, user_prompt, max_tokens, temperature
+        )
+        self._record(path, system_prompt, user_prompt, max_tokens, temperature, content)
+        return content
+
+    def stream(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Iterator[str]:
+        path = self._path(system_prompt, user_prompt, max_tokens, temperature)
+        recorded = self._load(path)
+        if recorded is not None or self.inner is None:
+            yield self._replay(path, recorded)
+            return
+        # only complete responses are recorded, not ones abandoned halfway
+        chunks = []
+        inner = self.inner.stream(system_prompt, user_prompt, max_tokens, temperature)
+        try:
+            for chunk in inner:
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            inner.close()
+        self._record(path, system_prompt, user_prompt, max_tokens, temperature, "".join(chunks))
+
+    async def stream_async(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> AsyncIterator[str]:
+        path = self._path(system_prompt, user_prompt, max_tokens, temperature)
+        recorded = self._load(path)
+        if recorded is not None or self.inner is None:
+            yield self._replay(path, recorded)
+            return
+        chunks = []
+        inner = self.inner.stream_async(system_prompt, user_prompt, max_tokens, temperature)
+        try:
+            async for chunk in inner:
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            await inner.aclose()
+        self._record(path, system_prompt, user_prompt, max_tokens, temperature, "".join(chunks))
+
+    def _path(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> str:
+        key = cache_key(self.cache_namespace, system_prompt, user_prompt, temperature, max_tokens)
+        return os.path.join(self.directory, f"{key}.json")
+
+    @staticmethod
+    def _load(path: str) -> Optional[dict[str, Any]]:
+        try:
+            with open(path, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _replay(path: str, recorded: Optional[dict[str, Any]]) -> Optional[str]:
+        if recorded is None:
+            raise MissingRecordingError(f"No recorded response in {path}")
+        logging.debug(f"Replaying LLM response from {path}")
+        return recorded["response"]
+
+    def _record(
+        self,
+        path: str,
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: int,
+        temperature: float,
+        content: Optional[str],
+    ) -> None:
+        if content is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        recording = {
+            "model": self.model,
+            "system": system_prompt,
+            "user": user_prompt,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "response": content,
+        }
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(recording, file, indent=2, ensure_ascii=False)
+        os.replace(temporary_path, path)
+        logging.debug(f"Recorded LLM response to {path}")
+
+
+def _namespace(model: str, base_url: Optional[str]) -> str:
+    # the same model name on another server is another model
+    return f"{model}@{base_url}" if base_url else model
+
+
+def create_backend(
+    kind: BackendKind,
+    model: str = DEFAULT_MODEL,
+    base_url: Optional[str] = None,
+    recordings_dir: Optional[str] = None,
+) -> LLMBackend:
+    if kind == BackendKind.OPENAI:
+        return OpenAIBackend(model, base_url=base_url)
+    if recordings_dir is None:
+        raise ValueError(f"The {kind.value} backend needs a recordings directory")
+    if kind == BackendKind.RECORD:
+        return RecordReplayBackend(recordings_dir, OpenAIBackend(model, base_url=base_url))
+    return RecordReplayBackend(recordings_dir, model=model, base_url=base_url)
@@ -0,0 +1,186 @@
+import asyncio
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from llm_backend import LLMBackend, MissingRecordingError, OpenAIBackend, RecordReplayBackend
+from rate_limit import RateLimiter, retry_with_backoff
+
+STREAMED_CHUNKS = ["def test_a(self):\n", "    self.assertTrue(True)\n"]
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    Speaks just enough of the chat completions API for the OpenAI clients: answers
+    every request with the content "ok", or with STREAMED_CHUNKS as server-sent
+    events when it asks for a stream. The first `rate_limited` requests get a 429.
+    """
+
+    def __init__(self, rate_limited: int = 0) -> None:
+        super().__init__(("127.0.0.1", 0), _FakeOpenAIHandler)
+        self.requests: list[dict] = []
+        self.rate_limited = rate_limited
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server: FakeOpenAIServer
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append({"path": self.path, **body})
+        if self.server.rate_limited > 0:
+            self.server.rate_limited -= 1
+            self._send_json(429, {"error": {"message": "slow down", "type": "rate_limit"}})
+        elif body.get("stream"):
+            self._send_stream(body["model"])
+        else:
+            message = {"role": "assistant", "content": "ok"}
+            self._send_json(200, _completion(body["model"], {"message": message}))
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for chunk in STREAMED_CHUNKS:
+            event = _completion(model, {"delta": {"content": chunk}}, "chat.completion.chunk")
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def _completion(model: str, choice: dict, kind: str = "chat.completion") -> dict:
+    return {
+        "id": "fake",
+        "object": kind,
+        "created": 0,
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop", **choice}],
+    }
+
+
+@unittest.skipUnless(importlib.util.find_spec("openai"), "needs the openai package")
+class OpenAIBackendTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = FakeOpenAIServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.server.requests.clear()
+        self.server.rate_limited = 0
+        # a local server needs no API key
+        self.backend = OpenAIBackend("local-model", api_key="", base_url=self.server.base_url)
+
+    def test_complete(self):
+        self.assertEqual(self.backend.complete("system", "user", 10, 0.5), "ok")
+        request = self.server.requests[0]
+        self.assertEqual(request["path"], "/v1/chat/completions")
+        self.assertEqual(request["model"], "local-model")
+        self.assertEqual(request["max_tokens"], 10)
+        self.assertEqual(
+            [message["content"] for message in request["messages"]], ["system", "user"]
+        )
+
+    def test_complete_async(self):
+        content = asyncio.run(self.backend.complete_async("system", "user", 10, 0.5))
+        self.assertEqual(content, "ok")
+
+    def test_stream(self):
+        chunks = list(self.backend.stream("system", "user", 10, 0.5))
+        self.assertEqual(chunks, STREAMED_CHUNKS)
+        self.assertTrue(self.server.requests[0]["stream"])
+
+    def test_stream_async(self):
+        async def collect() -> list[str]:
+            return [chunk async for chunk in self.backend.stream_async("system", "user", 10, 0.5)]
+
+        self.assertEqual(asyncio.run(collect()), STREAMED_CHUNKS)
+
+    def test_rate_limited_request_is_retried_by_backoff_not_the_client(self):
+        self.server.rate_limited = 1
+        limiter = RateLimiter(1)
+
+        async def request() -> str:
+            return await retry_with_backoff(
+                lambda: limiter.run(
+                    lambda: self.backend.complete_async("system", "user", 10, 0.5)
+                ),
+                base_delay=0.01,
+            )
+
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(asyncio.run(request()), "ok")
+        self.assertEqual(len(self.server.requests), 2)
+
+
+class EchoBackend(LLMBackend):
+    def __init__(self, model: str, base_url: Optional[str] = None) -> None:
+        self.model = model
+        self.base_url = base_url
+
+    @property
+    def cache_namespace(self) -> str:
+        return f"{self.model}@{self.base_url}" if self.base_url else self.model
+
+    def complete(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Optional[str]:
+        return f"{self.cache_namespace}: {user_prompt}"
+
+    async def complete_async(self, system_prompt, user_prompt, max_tokens, temperature):
+        return self.complete(system_prompt, user_prompt, max_tokens, temperature)
+
+
+class RecordReplayBackendTest(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def record(self, base_url: Optional[str]) -> str:
+        backend = RecordReplayBackend(self.directory, EchoBackend("model", base_url))
+        return backend.complete("system", "user", 10, 0.5)
+
+    def test_replays_what_was_recorded(self):
+        recorded = self.record("http://a/v1")
+        replay = RecordReplayBackend(self.directory, model="model", base_url="http://a/v1")
+        self.assertEqual(replay.complete("system", "user", 10, 0.5), recorded)
+        with self.assertRaises(MissingRecordingError):
+            replay.complete("system", "other", 10, 0.5)
+
+    def test_recordings_are_keyed_by_server(self):
+        self.record("http://a/v1")
+        self.record("http://b/v1")
+        self.record(None)
+        self.assertEqual(len(os.listdir(self.directory)), 3)
+        replay = RecordReplayBackend(self.directory, model="model", base_url="http://b/v1")
+        self.assertEqual(replay.complete("system", "user", 10, 0.5), "model@http://b/v1: user")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+# of both the LLM response cache and the mutation cache. Defined here, not in
+# mutation_cache, so the CLI gets it without loading sqlite3
+DEFAULT_CACHE_DIR = ".pymnt_cache"
+
+
+def cache_key(
+    model: str, system_prompt: str, user_prompt: str, temperature: float, max_tokens: int
+) -> str:
+    """Content address of a completion request."""
+    payload = json.dumps(
+        [model, system_prompt, user_prompt, temperature, max_tokens], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResponseCache(ABC):
+    """
+    Defines an interface for caching LLM responses by request key.
+    """
+
+    def __init__(self) -> None:
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get(key)
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def put(self, key: str, value: str) -> None:
+        pass
+
+
+class MemoryCache(ResponseCache):
+    """In-process LRU cache holding at most `max_entries` responses."""
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        super().__init__()
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+
+    def _get(self, key: str) -> Optional[str]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+
+class DiskCache(ResponseCache):
+    """
+    One file per response under `directory`. Entries older than `ttl` seconds are
+    ignored, and the least recently written entries are evicted once the cache
+    grows past `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: Optional[float] = 30 * 24 * 3600,
+    ) -> None:
+        super().__init__()
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def _get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            if self._ttl is not None and time.time() - os.path.getmtime(path) > self._ttl:
+                self._remove(path)
+                return None
+            with open(path, "r") as file:
+                return json.load(file)["content"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        path = self._path(key)
+        try:
+            if os.path.exists(path):
+                self._remove(path)
+            # batch workers may write the same entry at once, each needs its own file.
+            # Not tempfile, this module is imported on every start up
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w") as file:
+                json.dump({"content": value}, file)
+            os.replace(temporary_path, path)
+            self._size += os.path.getsize(path)
+        except OSError as e:
+            logging.warning(f"Could not write response cache entry {path}: {e}")
+            return
+        if self._size > self._max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        for path, _, _ in sorted(self._entries(), key=lambda entry: entry[1]):
+            if self._size <= self._max_bytes:
+                break
+            self._remove(path)
+
+    def _remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self._size -= size
+        except OSError:
+            pass
+
+    def _entries(self) -> list[tuple[str, float, int]]:
+        entries = []
+        for name in os.listdir(self._directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self._directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.json")
+
+
+class TieredCache(ResponseCache):
+    """Memory LRU in front of a disk cache. Disk hits are promoted to memory."""
+
+    def __init__(self, memory: MemoryCache, disk: DiskCache) -> None:
+        super().__init__()
+        self.memory = memory
+        self.disk = disk
+
+    def _get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        self.memory.put(key, value)
+        self.disk.put(key, value)
+
+
+def default_response_cache(cache_dir: str) -> TieredCache:
+    return TieredCache(MemoryCache(), DiskCache(os.path.join(cache_dir, "llm")))
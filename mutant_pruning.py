@@ -0,0 +1,202 @@
+import ast
+from collections import Counter
+from dataclasses import dataclass, field
+from enum import Enum
+from types import CodeType
+from typing import Any, Optional
+
+
+class PruneReason(Enum):
+    DEAD_CODE = "dead code"  # the mutated statement can never run
+    TRIVIAL = "trivial"  # a known identity, e.g. `x + 0` -> `x - 0`
+    EQUIVALENT = "equivalent"  # compiles to the same bytecode as the original
+    DUPLICATE = "duplicate"  # compiles to the same bytecode as another mutant
+    SUBSUMED = "subsumed"  # another mutant of the same expression represents it
+    STILLBORN = "stillborn"  # the mutated function does not compile
+
+
+@dataclass
+class PruneCandidate:
+    """
+    What the pruner needs to know about a mutant: where it sits, what it replaces
+    `node` with, and the code objects of the mutated and the original function.
+    `code` is None when the mutated function could not be compiled.
+    """
+
+    mutant_id: int
+    function: str
+    function_node: ast.AST
+    node: ast.AST
+    mutated: ast.AST
+    operator: str
+    code: Optional[CodeType]
+    original_code: CodeType
+
+
+@dataclass
+class PruneReport:
+    total: int = 0
+    # mutant ID -> why it was pruned
+    pruned: dict[int, PruneReason] = field(default_factory=dict)
+
+    @property
+    def kept(self) -> int:
+        return self.total - len(self.pruned)
+
+    def by_reason(self) -> dict[PruneReason, int]:
+        counts = Counter(self.pruned.values())
+        return {reason: counts[reason] for reason in PruneReason if counts[reason]}
+
+    def summary(self) -> str:
+        reasons = ", ".join(
+            f"{count} {reason.value}" for reason, count in self.by_reason().items()
+        )
+        return f"Pruned {len(self.pruned)}/{self.total} mutants" + (
+            f" ({reasons})" if reasons else ""
+        )
+
+
+class MutantPruner:
+    """
+    Drops mutants before they are executed: ones that do not compile, ones in
+    unreachable code, known trivial identities, ones the compiler normalizes (constant
+    folding, dead branch removal) back to the original bytecode, and duplicates
+    compiling to the same bytecode as an earlier mutant of the same function.
+
+    With `representative` only the first mutant of every (expression, operator) pair
+    is kept. The replacement tables list the boundary mutation first (`<` -> `<=`,
+    `n` -> `n + 1`), which is the one most likely to subsume the rest.
+    """
+
+    def __init__(self, representative: bool = False) -> None:
+        self._representative = representative
+
+    def prune(self, candidates: list[PruneCandidate]) -> PruneReport:
+        report = PruneReport(total=len(candidates))
+        dead_nodes: dict[int, set[int]] = {}
+        original_fingerprints: dict[int, tuple] = {}
+        seen_fingerprints: dict[tuple[str, tuple], int] = {}
+        seen_expressions: set[tuple[int, str]] = set()
+
+        for candidate in sorted(candidates, key=lambda candidate: candidate.mutant_id):
+            function_key = id(candidate.function_node)
+            if function_key not in dead_nodes:
+                dead_nodes[function_key] = _dead_nodes(candidate.function_node)
+                original_fingerprints[function_key] = code_fingerprint(candidate.original_code)
+
+            reason = None
+            if candidate.code is None:
+                reason = PruneReason.STILLBORN
+            elif id(candidate.node) in dead_nodes[function_key]:
+                reason = PruneReason.DEAD_CODE
+            elif _is_trivial(candidate.node, candidate.mutated):
+                reason = PruneReason.TRIVIAL
+            else:
+                fingerprint = code_fingerprint(candidate.code)
+                if fingerprint == original_fingerprints[function_key]:
+                    reason = PruneReason.EQUIVALENT
+                elif (candidate.function, fingerprint) in seen_fingerprints:
+                    reason = PruneReason.DUPLICATE
+                else:
+                    seen_fingerprints[(candidate.function, fingerprint)] = candidate.mutant_id
+
+            if reason is None and self._representative:
+                expression = (id(candidate.node), candidate.operator)
+                if expression in seen_expressions:
+                    reason = PruneReason.SUBSUMED
+                seen_expressions.add(expression)
+
+            if reason is not None:
+                report.pruned[candidate.mutant_id] = reason
+        return report
+
+
+def code_fingerprint(code: CodeType) -> tuple:
+    """
+    Everything about a code object that affects what it does, leaving out names,
+    positions and line tables.
+    """
+    return (
+        code.co_code,
+        tuple(_const_fingerprint(const) for const in code.co_consts),
+        code.co_names,
+        code.co_varnames,
+        code.co_freevars,
+        code.co_cellvars,
+        getattr(code, "co_exceptiontable", b""),
+    )
+
+
+def _const_fingerprint(const: Any) -> Any:
+    if isinstance(const, CodeType):
+        return code_fingerprint(const)
+    if isinstance(const, (tuple, frozenset)):
+        return (type(const).__name__, tuple(_const_fingerprint(item) for item in const))
+    # 1 == 1.0 == True, so the type has to be part of the fingerprint
+    return (type(const).__name__, repr(const))
+
+
+_TERMINAL_STATEMENTS = (ast.Return, ast.Raise, ast.Break, ast.Continue)
+
+
+def _dead_nodes(function: ast.AST) -> set[int]:
+    """
+    IDs of all nodes inside statements that can never run: statements following a
+    return, raise, break or continue in the same block, and bodies of `if`/`while`
+    statements whose condition is a false constant.
+    """
+    dead: set[int] = set()
+
+    def mark(statements: list[ast.stmt]) -> None:
+        for statement in statements:
+            dead.update(id(node) for node in ast.walk(statement))
+
+    for node in ast.walk(function):
+        for block_field in ("body", "orelse", "finalbody"):
+            block = getattr(node, block_field, None)
+            if not isinstance(block, list):
+                continue
+            for index, statement in enumerate(block):
+                if isinstance(statement, _TERMINAL_STATEMENTS):
+                    mark(block[index + 1 :])
+                    break
+        if isinstance(node, (ast.If, ast.While)) and isinstance(node.test, ast.Constant):
+            if node.test.value:
+                mark(node.orelse)
+            else:
+                mark(node.body)
+    return dead
+
+
+def _is_zero(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.Constant)
+        and isinstance(node.value, (int, float))
+        and not isinstance(node.value, bool)
+        and node.value == 0
+    )
+
+
+def _is_one(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.Constant)
+        and isinstance(node.value, int)
+        and not isinstance(node.value, bool)
+        and node.value == 1
+    )
+
+
+def _is_trivial(node: ast.AST, mutated: ast.AST) -> bool:
+    """
+    Operator swaps that cannot change the result for numbers: adding or subtracting
+    zero on the right, and `x ** 1` -> `x * 1`.
+    """
+    if not isinstance(node, (ast.BinOp, ast.AugAssign)) or type(node) is not type(mutated):
+        return False
+    right = node.right if isinstance(node, ast.BinOp) else node.value
+    swap = (type(node.op), type(mutated.op))
+    if swap in ((ast.Add, ast.Sub), (ast.Sub, ast.Add)):
+        return _is_zero(right)
+    if swap == (ast.Pow, ast.Mult):
+        return _is_one(right)
+    return False
@@ -0,0 +1,90 @@
+import ast
+import unittest
+from typing import Optional
+from mutant_pruning import MutantPruner, PruneCandidate, PruneReason
+
+SOURCE = """
+def f(x):
+    y = x * (2 ** 2)
+    return y + 1
+    return y - 1
+"""
+
+
+class Candidates:
+    """Builds prune candidates for mutants of SOURCE, compiled the way the runner does."""
+
+    def __init__(self) -> None:
+        self.function = ast.parse(SOURCE).body[0]
+        self.original_code = compile(SOURCE, "<f>", "exec")
+        self.next_id = 1
+
+    def binop(self, line: int) -> ast.BinOp:
+        return next(
+            node
+            for node in ast.walk(self.function)
+            if isinstance(node, ast.BinOp) and node.lineno == line
+        )
+
+    def make(self, node: ast.AST, mutated: ast.AST, source: Optional[str]) -> PruneCandidate:
+        candidate = PruneCandidate(
+            self.next_id,
+            "f",
+            self.function,
+            node,
+            mutated,
+            "AOR",
+            compile(source, "<f>", "exec") if source is not None else None,
+            self.original_code,
+        )
+        self.next_id += 1
+        return candidate
+
+
+class MutantPrunerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.candidates = Candidates()
+
+    def prune(self, *candidates: PruneCandidate, representative: bool = False) -> dict:
+        return MutantPruner(representative).prune(list(candidates)).pruned
+
+    def test_mutant_that_does_not_compile_is_pruned(self):
+        node = self.candidates.binop(4)
+        pruned = self.prune(
+            self.candidates.make(node, node, None),
+            self.candidates.make(node, node, SOURCE.replace("y + 1", "y - 1")),
+        )
+        self.assertEqual(pruned, {1: PruneReason.STILLBORN})
+
+    def test_mutant_after_a_return_is_dead_code(self):
+        node = self.candidates.binop(5)
+        pruned = self.prune(self.candidates.make(node, node, SOURCE.replace("y - 1", "y + 1")))
+        self.assertEqual(pruned, {1: PruneReason.DEAD_CODE})
+
+    def test_mutant_folded_back_to_the_original_is_equivalent(self):
+        node = self.candidates.binop(3)
+        # 2 ** 2 and 2 * 2 are both folded to the constant 4
+        mutated = SOURCE.replace("2 ** 2", "2 * 2")
+        pruned = self.prune(self.candidates.make(node, node, mutated))
+        self.assertEqual(pruned, {1: PruneReason.EQUIVALENT})
+
+    def test_mutants_with_the_same_bytecode_are_duplicates(self):
+        node = self.candidates.binop(4)
+        mutated = SOURCE.replace("y + 1", "y - 1")
+        pruned = self.prune(
+            self.candidates.make(node, node, mutated), self.candidates.make(node, node, mutated)
+        )
+        self.assertEqual(pruned, {2: PruneReason.DUPLICATE})
+
+    def test_representative_keeps_one_mutant_per_expression_and_operator(self):
+        node = self.candidates.binop(4)
+        pruned = self.prune(
+            self.candidates.make(node, node, SOURCE.replace("y + 1", "y - 1")),
+            self.candidates.make(node, node, SOURCE.replace("y + 1", "y * 1")),
+            representative=True,
+        )
+        self.assertEqual(pruned, {2: PruneReason.SUBSUMED})
+
+
+if __name__ == "__main__":
+    unittest.main()
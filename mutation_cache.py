@@ -0,0 +1,109 @@
+import logging
+import os
+import random
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Optional
+from llm_cache import DEFAULT_CACHE_DIR
+# seconds to wait for another process holding the write lock before giving up
+BUSY_TIMEOUT = 2.0
+# a fresh database is created by whichever process gets there first, the others may
+# find it locked while its journal mode changes
+OPEN_ATTEMPTS = 5
+
+
+@dataclass
+class CachedResult:
+    status: str
+    duration: float
+    killed_by: Optional[str] = None
+
+
+class MutationCache:
+    """
+    Persistent store of mutant outcomes, backed by SQLite under the cache directory.
+    Keys are content hashes, so a changed function or test simply stops matching.
+    Several processes can share the directory: every put is committed right away,
+    and a database that stays locked turns into a cache miss, not an error. One that
+    cannot even be opened leaves the run without a cache.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR) -> None:
+        self.hits = 0
+        self.misses = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "mutants.sqlite3")
+        for attempt in range(1, OPEN_ATTEMPTS + 1):
+            try:
+                self._connection = self._open(path)
+                return
+            except sqlite3.OperationalError as e:
+                logging.debug(f"Opening the mutation cache failed (attempt {attempt}): {e}")
+                error = e
+            time.sleep(random.uniform(0, 0.1 * attempt))
+        logging.warning(f"Mutation cache unavailable, running without it: {error}")
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        try:
+            # readers never block the writer, and commits need no fsync of the database
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                connection.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS results (
+                        key TEXT PRIMARY KEY,
+                        status TEXT NOT NULL,
+                        duration REAL NOT NULL,
+                        killed_by TEXT
+                    )
+                    """
+                )
+        except sqlite3.OperationalError:
+            connection.close()
+            raise
+        return connection
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        if self._connection is None:
+            self.misses += 1
+            return None
+        try:
+            row = self._connection.execute(
+                "SELECT status, duration, killed_by FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Mutation cache unavailable, treating {key} as a miss: {e}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CachedResult(*row)
+
+    def put(self, key: str, result: CachedResult) -> None:
+        if self._connection is None:
+            return
+        try:
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO results (key, status, duration, killed_by) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, result.status, result.duration, result.killed_by),
+                )
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Mutation cache unavailable, not storing {key}: {e}")
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+
+    def __enter__(self) -> "MutationCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
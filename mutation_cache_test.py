@@ -0,0 +1,35 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from mutation_cache import CachedResult, MutationCache
+
+
+class MutationCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_round_trip(self):
+        with MutationCache(self.directory) as cache:
+            self.assertIsNone(cache.get("key"))
+            cache.put("key", CachedResult("killed", 0.5, "test_a"))
+        with MutationCache(self.directory) as cache:
+            self.assertEqual(cache.get("key"), CachedResult("killed", 0.5, "test_a"))
+            self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_locked_database_runs_without_the_cache(self):
+        holder = sqlite3.connect(os.path.join(self.directory, "mutants.sqlite3"))
+        self.addCleanup(holder.close)
+        holder.execute("BEGIN EXCLUSIVE")
+        with mock.patch("mutation_cache.BUSY_TIMEOUT", 0.01), mock.patch("time.sleep"):
+            with self.assertLogs(level="WARNING"), MutationCache(self.directory) as cache:
+                cache.put("key", CachedResult("killed", 0.5))
+                self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.misses, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator, Optional
+from mutation_tester import Mutant, MutantResult, MutationReport, MutationStatus
+
+EVENTS_FILE = "events.jsonl"
+SUMMARY_FILE = "summary.json"
+DIFF_FILE = "diff.json"
+
+
+def mutant_key(mutant: Mutant) -> str:
+    """
+    Identifies a mutant across runs. IDs shift as soon as the target changes, the
+    position and mutation mostly do not.
+    """
+    return (
+        f"{mutant.function}:{mutant.line}:{mutant.col}:"
+        f"{mutant.operator.value}:{mutant.description}"
+    )
+
+
+def mutant_event(result: MutantResult) -> dict[str, Any]:
+    mutant = result.mutant
+    return {
+        "event": "mutant",
+        "id": mutant.id,
+        "file": mutant.file,
+        "function": mutant.function,
+        "line": mutant.line,
+        "col": mutant.col,
+        "operator": mutant.operator.value,
+        "description": mutant.description,
+        "status": result.status.value,
+        "killed": result.killed,
+        "duration": round(result.duration, 6),
+        "killed_by": result.killed_by,
+        "cached": result.cached,
+        "time": time.time(),
+    }
+
+
+@dataclass
+class ReportDiff:
+    previous_score: Optional[float]
+    score: float
+    # mutant keys, see mutant_key
+    newly_killed: list[str] = field(default_factory=list)
+    newly_survived: list[str] = field(default_factory=list)
+    added: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        if self.previous_score is None:
+            return f"No previous report, mutation score {self.score:.1%}"
+        return (
+            f"Mutation score {self.previous_score:.1%} -> {self.score:.1%}: "
+            f"{len(self.newly_killed)} newly killed, {len(self.newly_survived)} newly survived, "
+            f"{len(self.added)} new and {len(self.removed)} removed mutants"
+        )
+
+
+class MutationEventLog:
+    """
+    Streams mutation results to `<directory>/events.jsonl`, one JSON object per line,
+    flushed as every mutant finishes, so dashboards can follow long runs live (see
+    `follow_events`). Pass the instance as `on_result` to `ASTMutationRunner.run`.
+
+    `finish` appends an end event and writes a summary report with a per-function
+    breakdown, plus a diff against the summary of the previous run.
+    """
+
+    def __init__(self, directory: str, target: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._target = target
+        self._file = open(os.path.join(directory, EVENTS_FILE), "w")
+        self._write({"event": "start", "target": target, "time": time.time()})
+
+    def __call__(self, result: MutantResult) -> None:
+        self._write(mutant_event(result))
+
+    def finish(self, report: MutationReport) -> ReportDiff:
+        summary = summarize(report)
+        previous = _load_json(os.path.join(self._directory, SUMMARY_FILE))
+        diff = diff_summaries(previous, summary)
+        _write_json(os.path.join(self._directory, SUMMARY_FILE), summary)
+        _write_json(os.path.join(self._directory, DIFF_FILE), asdict(diff))
+        self._write(
+            {
+                "event": "end",
+                "target": self._target,
+                "score": summary["score"],
+                "killed": summary["killed"],
+                "total": summary["total"],
+                "duration": summary["duration"],
+                "time": time.time(),
+            }
+        )
+        self.close()
+        return diff
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self) -> "MutationEventLog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _write(self, event: dict[str, Any]) -> None:
+        self._file.write(json.dumps(event) + "\n")
+        self._file.flush()
+
+
+def summarize(report: MutationReport) -> dict[str, Any]:
+    functions: dict[str, dict[str, Any]] = {}
+    for result in report.scored:
+        entry = functions.setdefault(
+            result.mutant.function, {"total": 0, "killed": 0, "survived": 0}
+        )
+        entry["total"] += 1
+        entry["killed" if result.killed else "survived"] += 1
+    for entry in functions.values():
+        entry["score"] = entry["killed"] / entry["total"]
+
+    return {
+        "target": report.target,
+        "score": report.score,
+        "killed": len(report.killed),
+        "total": len(report.scored),
+        "stillborn": len(report.stillborn),
+        "duration": round(report.duration, 6),
+        "pruned": (
+            {reason.value: count for reason, count in report.pruned.by_reason().items()}
+            if report.pruned is not None
+            else {}
+        ),
+        "sample": _sample_summary(report),
+        "functions": functions,
+        "mutants": {mutant_key(result.mutant): result.status.value for result in report.results},
+    }
+
+
+def diff_summaries(previous: Optional[dict[str, Any]], current: dict[str, Any]) -> ReportDiff:
+    if previous is None:
+        return ReportDiff(previous_score=None, score=current["score"])
+
+    # "timeout" is what earlier reports called a timed out mutant
+    killed_statuses = {MutationStatus.KILLED.value, MutationStatus.TIMEOUT.value, "timeout"}
+    before = previous.get("mutants", {})
+    after = current["mutants"]
+    # a mutant missing from a sampled run was not drawn, it did not go anywhere
+    sampled = previous.get("sample") is not None or current.get("sample") is not None
+    diff = ReportDiff(previous_score=previous.get("score"), score=current["score"])
+    for key, status in after.items():
+        if key not in before:
+            if not sampled:
+                diff.added.append(key)
+        elif status in killed_statuses and before[key] not in killed_statuses:
+            diff.newly_killed.append(key)
+        elif status not in killed_statuses and before[key] in killed_statuses:
+            diff.newly_survived.append(key)
+    if not sampled:
+        diff.removed = [key for key in before if key not in after]
+    return diff
+
+
+def read_events(path: str) -> list[dict[str, Any]]:
+    """
+    Reads the events written so far. A line still being written is skipped.
+    """
+    events = []
+    with open(path, "r") as file:
+        for line in file:
+            if not line.endswith("\n"):
+                break
+            events.append(json.loads(line))
+    return events
+
+
+def follow_events(
+    path: str, poll_interval: float = 0.5, timeout: Optional[float] = None
+) -> Iterator[dict[str, Any]]:
+    """
+    Yields events as the runner writes them, like `tail -f`, until the end event or,
+    with `timeout`, until nothing new arrived for that many seconds.
+    """
+    last_event = time.monotonic()
+    while not os.path.exists(path):
+        if timeout is not None and time.monotonic() - last_event > timeout:
+            return
+        time.sleep(poll_interval)
+
+    with open(path, "r") as file:
+        pending = ""
+        while True:
+            chunk = file.readline()
+            if not chunk:
+                if timeout is not None and time.monotonic() - last_event > timeout:
+                    return
+                time.sleep(poll_interval)
+                continue
+            pending += chunk
+            if not pending.endswith("\n"):
+                continue
+            event = json.loads(pending)
+            pending = ""
+            last_event = time.monotonic()
+            yield event
+            if event.get("event") == "end":
+                return
+
+
+def _sample_summary(report: MutationReport) -> Optional[dict[str, Any]]:
+    if report.sample is None:
+        return None
+    low, high = report.score_interval
+    return {
+        "population": report.sample.population,
+        "seed": report.sample.seed,
+        "stop_reason": report.sample.stop_reason.name.lower(),
+        "confidence": report.sample.confidence,
+        "interval": [low, high],
+    }
+
+
+def _load_json(path: str) -> Optional[dict[str, Any]]:
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: dict[str, Any]) -> None:
+    # readers polling the report must never see it half written
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(descriptor, "w") as file:
+        json.dump(data, file, indent=2)
+    os.replace(temp_path, path)
@@ -0,0 +1,170 @@
+import logging
+import math
+import re
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import TYPE_CHECKING, Optional
+
+# random and statistics are imported where they are used, pymnt imports this module
+# for its --help
+if TYPE_CHECKING:
+    from mutation_tester import Mutant, MutantResult
+
+DEFAULT_CONFIDENCE = 0.95
+# the interval of a handful of results is too unreliable to stop on
+MIN_SAMPLE_SIZE = 20
+
+_DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+
+class StopReason(Enum):
+    EXHAUSTED = "all sampled mutants ran"
+    MUTANT_BUDGET = "mutant budget"
+    TIME_BUDGET = "time budget"
+    CI_WIDTH = "confidence interval"
+
+
+@dataclass
+class SampleInfo:
+    """How the mutants of a sampled run were chosen and why sampling stopped."""
+
+    population: int  # mutants the sample was drawn from
+    seed: int
+    confidence: float = DEFAULT_CONFIDENCE
+    stop_reason: StopReason = StopReason.EXHAUSTED
+
+
+def parse_duration(text: str) -> float:
+    """Seconds in "90", "90s", "1.5m" or "2h"."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*", text.lower())
+    if match is None:
+        raise ValueError(f"Invalid duration {text!r}, expected e.g. 60s, 5m or 1h")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+def wilson_interval(
+    killed: int,
+    sampled: int,
+    confidence: float = DEFAULT_CONFIDENCE,
+    population: Optional[int] = None,
+) -> tuple[float, float]:
+    """
+    Wilson score interval of the mutation score from `killed` of `sampled` mutants.
+    With the `population` size, the finite population correction narrows it as the
+    sample covers more of the population, down to nothing once it covers all of it.
+    """
+    from statistics import NormalDist
+
+    if sampled == 0:
+        return 0.0, 1.0
+    score = killed / sampled
+    if population is not None and sampled >= population:
+        return score, score
+    effective = float(sampled)
+    if population is not None and population > 1:
+        effective = sampled * (population - 1) / (population - sampled)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    center = (score + z * z / (2 * effective)) / (1 + z * z / effective)
+    margin = (
+        z
+        * math.sqrt(score * (1 - score) / effective + z * z / (4 * effective * effective))
+        / (1 + z * z / effective)
+    )
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def stratified_order(mutants: list["Mutant"], seed: int) -> list["Mutant"]:
+    """
+    Shuffle the mutants so that every prefix of the order is a proportionally
+    stratified sample by function and operator: each stratum is shuffled, and its
+    k-th of n mutants is placed at (k + u) / n with one random offset u per stratum.
+    """
+    import random
+
+    rng = random.Random(seed)
+    strata: dict[tuple[str, str], list["Mutant"]] = {}
+    for mutant in mutants:
+        strata.setdefault((mutant.function, mutant.operator.value), []).append(mutant)
+
+    positions: list[tuple[float, int, "Mutant"]] = []
+    for key in sorted(strata):
+        stratum = strata[key]
+        rng.shuffle(stratum)
+        offset = rng.random()
+        for k, mutant in enumerate(stratum):
+            positions.append(((k + offset) / len(stratum), mutant.id, mutant))
+    return [mutant for _, _, mutant in sorted(positions, key=lambda position: position[:2])]
+
+
+class MutantSampler:
+    """
+    Runs a stratified random sample of the mutants instead of all of them. The
+    sample is cut to `mutant_budget` mutants, and the run stops early once the
+    mutants have run for `time_budget` seconds or the confidence interval of the
+    score is narrower than `ci_width`. Mutants already running are finished.
+    Without a `seed` a random one is drawn and logged, so a run can be reproduced.
+    """
+
+    def __init__(
+        self,
+        mutant_budget: Optional[int] = None,
+        time_budget: Optional[float] = None,
+        ci_width: Optional[float] = None,
+        seed: Optional[int] = None,
+        confidence: float = DEFAULT_CONFIDENCE,
+    ) -> None:
+        import random
+
+        if mutant_budget is not None and mutant_budget < 1:
+            raise ValueError(f"The mutant budget must be at least 1, got {mutant_budget}")
+        if ci_width is not None and not ci_width > 0:
+            raise ValueError(f"The confidence interval width must be positive, got {ci_width}")
+        if not 0 < confidence < 1:
+            raise ValueError(f"The confidence must be between 0 and 1, got {confidence}")
+        self.mutant_budget = mutant_budget
+        self.time_budget = time_budget
+        self.ci_width = ci_width
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.confidence = confidence
+        self.info: Optional[SampleInfo] = None
+        self._killed = 0
+        self._sampled = 0
+        self._started_at = time.monotonic()
+
+    def start(self, mutants: list["Mutant"]) -> list["Mutant"]:
+        """Start the clock and return the mutants to run, in the order to run them."""
+        self._started_at = time.monotonic()
+        self._killed = self._sampled = 0
+        self.info = SampleInfo(len(mutants), self.seed, self.confidence)
+        ordered = stratified_order(mutants, self.seed)
+        if self.mutant_budget is not None and self.mutant_budget < len(ordered):
+            ordered = ordered[: self.mutant_budget]
+            self.info.stop_reason = StopReason.MUTANT_BUDGET
+        logging.info(
+            f"Sampling {len(ordered)} of {len(mutants)} mutants with seed {self.seed}"
+        )
+        return ordered
+
+    def record(self, result: "MutantResult") -> None:
+        self._sampled += 1
+        self._killed += result.killed
+
+    def interval(self) -> tuple[float, float]:
+        population = self.info.population if self.info is not None else None
+        return wilson_interval(self._killed, self._sampled, self.confidence, population)
+
+    def should_stop(self) -> bool:
+        """Checked before every mutant that has not started yet."""
+        if self.info is None:
+            return False
+        elapsed = time.monotonic() - self._started_at
+        if self.time_budget is not None and elapsed >= self.time_budget:
+            self.info.stop_reason = StopReason.TIME_BUDGET
+            return True
+        if self.ci_width is not None and self._sampled >= MIN_SAMPLE_SIZE:
+            low, high = self.interval()
+            if high - low <= self.ci_width:
+                self.info.stop_reason = StopReason.CI_WIDTH
+                return True
+        return False
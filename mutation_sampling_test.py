@@ -0,0 +1,84 @@
+import unittest
+from mutation_sampling import (
+    MIN_SAMPLE_SIZE,
+    MutantSampler,
+    StopReason,
+    parse_duration,
+    stratified_order,
+    wilson_interval,
+)
+from mutation_tester import Mutant, MutantResult, MutationStatus, Operator
+
+
+def mutants(function: str, operator: Operator, count: int, first_id: int = 0) -> list[Mutant]:
+    return [
+        Mutant(first_id + index, function, index + 1, 0, operator, "")
+        for index in range(count)
+    ]
+
+
+class WilsonIntervalTest(unittest.TestCase):
+    def test_known_interval(self):
+        low, high = wilson_interval(8, 10)
+        self.assertAlmostEqual(low, 0.4902, places=4)
+        self.assertAlmostEqual(high, 0.9433, places=4)
+
+    def test_finite_population_narrows_the_interval(self):
+        low, high = wilson_interval(8, 10, population=20)
+        self.assertGreater(low, wilson_interval(8, 10)[0])
+        self.assertLess(high, wilson_interval(8, 10)[1])
+        self.assertEqual(wilson_interval(8, 10, population=10), (0.8, 0.8))
+
+    def test_nothing_sampled(self):
+        self.assertEqual(wilson_interval(0, 0), (0.0, 1.0))
+
+
+class StratifiedOrderTest(unittest.TestCase):
+    def test_every_prefix_is_proportional(self):
+        population = mutants("f", Operator.ARITHMETIC, 10) + mutants(
+            "g", Operator.COMPARISON, 10, first_id=10
+        )
+        for seed in range(5):
+            order = stratified_order(list(population), seed)
+            self.assertEqual(sorted(mutant.id for mutant in order), list(range(20)))
+            prefix = [mutant.function for mutant in order[:10]]
+            self.assertEqual(prefix.count("f"), 5)
+
+    def test_seed_reproduces_the_order(self):
+        population = mutants("f", Operator.ARITHMETIC, 10)
+        self.assertEqual(
+            stratified_order(list(population), 7), stratified_order(list(population), 7)
+        )
+
+
+class MutantSamplerTest(unittest.TestCase):
+    def test_mutant_budget_cuts_the_sample(self):
+        sampler = MutantSampler(mutant_budget=3, seed=1)
+        self.assertEqual(len(sampler.start(mutants("f", Operator.ARITHMETIC, 10))), 3)
+        self.assertEqual(sampler.info.stop_reason, StopReason.MUTANT_BUDGET)
+
+    def test_stops_once_the_interval_is_narrow(self):
+        population = mutants("f", Operator.ARITHMETIC, 1000)
+        sampler = MutantSampler(ci_width=0.2, seed=1)
+        sampler.start(population)
+        for mutant in population[:MIN_SAMPLE_SIZE]:
+            self.assertFalse(sampler.should_stop())
+            sampler.record(MutantResult(mutant, MutationStatus.KILLED, 0.0))
+        self.assertTrue(sampler.should_stop())
+        self.assertEqual(sampler.info.stop_reason, StopReason.CI_WIDTH)
+
+    def test_invalid_settings(self):
+        for options in [{"mutant_budget": 0}, {"ci_width": 0}, {"confidence": 1.0}]:
+            with self.subTest(options=options), self.assertRaises(ValueError):
+                MutantSampler(**options)
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("90"), 90)
+        self.assertEqual(parse_duration("1.5m"), 90)
+        self.assertEqual(parse_duration("2h"), 7200)
+        with self.assertRaises(ValueError):
+            parse_duration("soon")
+
+
+if __name__ == "__main__":
+    unittest.main()
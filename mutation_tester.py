@@ -1,5 +1,31 @@
 import subprocess
 import abc
+import ast
+import copy
+import hashlib
+import importlib
+import inspect
+import logging
+import multiprocessing
+import os
+import pickle
+import select
+import signal
+import sys
+import threading
+import time
+import unittest
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection, wait
+from enum import Enum
+from types import CodeType, FunctionType
+from typing import Any, Callable, Iterable, Iterator, Optional
+from line_coverage import CoverageIndex, run_with_coverage
+from mutation_cache import DEFAULT_CACHE_DIR, CachedResult, MutationCache
+from mutant_pruning import MutantPruner, PruneCandidate, PruneReport
+from mutation_sampling import MutantSampler, SampleInfo, wilson_interval
+from schemata import ACTIVE_MUTANT, build_schema
+from unit_tests import TestStatistics, TimedTestResult, UnitTests, iter_tests
 
 
 class MutationRunner(abc.ABC):
@@ -15,8 +41,13 @@ class MutationRunner(abc.ABC):
     def run(self):
         pass
 
+    def _convert_path_to_module(self, path):
+        """
+        Convert a file path to a module path.
+        """
+        return path.replace("./", "").replace("/", ".").replace(".py", "")
+
 
-# todo: implement a MutPyRunner that is not dependent on the command line
 class MutPyRunner(MutationRunner):
     """
     Defines a runner for MutPy mutation testing tool.
@@ -36,12 +67,6 @@ class MutPyRunner(MutationRunner):
             "unittest",
         ]
 
-    def _convert_path_to_module(self, path):
-        """
-        Convert a file path to a module path.
-        """
-        return path.replace("./", "").replace("/", ".").replace(".py", "")
-
     # Pretty naive implementation. Should be improved. Definitely not alright to run mut py from the command line.
     def run(self):
         try:
@@ -71,3 +96,1199 @@ class MutPyRunner(MutationRunner):
             raise RuntimeError(
                 "MutPy command not found. Make sure it's installed and in your PATH."
             )
+
+
+class Operator(Enum):
+    ARITHMETIC = "AOR"  # arithmetic operator replacement
+    COMPARISON = "ROR"  # relational operator replacement
+    BOOLEAN = "LCR"  # logical connector replacement / negation removal
+    CONSTANT = "CRP"  # constant replacement
+    RETURN = "RVR"  # return value replacement
+
+
+class ExecutionMode(Enum):
+    POOL = "pool"  # persistent workers, mutants share a process until one times out
+    FORK = "fork"  # a fresh copy-on-write fork of the loaded modules per mutant
+
+
+class MutationStatus(Enum):
+    KILLED = "killed"
+    SURVIVED = "survived"
+    TIMEOUT = "killed (timeout)"  # the tests noticed something was off
+    UNCOVERED = "survived (uncovered)"  # no test executes the mutated line
+    STILLBORN = "stillborn"  # the mutated function does not compile, not part of the score
+
+    @classmethod
+    def _missing_(cls, value: object) -> Optional["MutationStatus"]:
+        # cached results and reports written before timeouts were labelled as kills
+        return cls.TIMEOUT if value == "timeout" else None
+
+
+@dataclass(frozen=True)
+class Mutant:
+    id: int
+    function: str
+    line: int
+    col: int
+    operator: Operator
+    description: str
+    file: str = ""
+
+
+@dataclass
+class MutantResult:
+    mutant: Mutant
+    status: MutationStatus
+    duration: float
+    killed_by: Optional[str] = None
+    cached: bool = False  # taken from the result cache instead of being executed
+    # how long each test that ran against the mutant took, in the order they ran
+    test_durations: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def killed(self) -> bool:
+        return self.status in (MutationStatus.KILLED, MutationStatus.TIMEOUT)
+
+
+@dataclass
+class MutationReport:
+    target: str
+    results: list[MutantResult] = field(default_factory=list)
+    duration: float = 0.0
+    # mutants dropped before execution, they do not count towards the score
+    pruned: Optional[PruneReport] = None
+    # set when only a sample of the mutants ran, the score is then an estimate
+    sample: Optional[SampleInfo] = None
+
+    @property
+    def scored(self) -> list[MutantResult]:
+        """The results the score is computed from, all but the stillborn mutants."""
+        return [result for result in self.results if result.status != MutationStatus.STILLBORN]
+
+    @property
+    def stillborn(self) -> list[MutantResult]:
+        return [result for result in self.results if result.status == MutationStatus.STILLBORN]
+
+    @property
+    def killed(self) -> list[MutantResult]:
+        return [result for result in self.scored if result.killed]
+
+    @property
+    def survived(self) -> list[MutantResult]:
+        return [result for result in self.scored if not result.killed]
+
+    @property
+    def score(self) -> float:
+        scored = self.scored
+        if not scored:
+            return 0.0
+        return len(self.killed) / len(scored)
+
+    @property
+    def score_interval(self) -> Optional[tuple[float, float]]:
+        """Confidence interval of the score of all mutants, for sampled runs."""
+        if self.sample is None:
+            return None
+        return wilson_interval(
+            len(self.killed), len(self.scored), self.sample.confidence, self.sample.population
+        )
+
+    def summary(self) -> str:
+        lines = [
+            f"Mutation score for {self.target}: {self.score:.1%} "
+            f"({len(self.killed)}/{len(self.scored)} killed in {self.duration:.2f}s)"
+        ]
+        if self.stillborn:
+            lines.append(f"  {len(self.stillborn)} stillborn mutants did not compile")
+        if self.sample is not None:
+            low, high = self.score_interval
+            lines.append(
+                f"  Sampled {len(self.results)} of {self.sample.population} mutants "
+                f"(seed {self.sample.seed}, stopped by {self.sample.stop_reason.value}), "
+                f"{self.sample.confidence:.0%} confidence interval {low:.1%} - {high:.1%}"
+            )
+        if self.pruned is not None and self.pruned.pruned:
+            lines.append(f"  {self.pruned.summary()}")
+        for result in self.survived:
+            mutant = result.mutant
+            lines.append(
+                f"  {result.status.value} #{mutant.id} {mutant.function}:{mutant.line} "
+                f"[{mutant.operator.value}] {mutant.description}"
+            )
+        return "\n".join(lines)
+
+
+_ARITHMETIC_REPLACEMENTS: dict[type, list[type]] = {
+    ast.Add: [ast.Sub, ast.Mult],
+    ast.Sub: [ast.Add],
+    ast.Mult: [ast.Div, ast.Add],
+    ast.Div: [ast.Mult, ast.FloorDiv],
+    ast.FloorDiv: [ast.Div, ast.Mult],
+    ast.Mod: [ast.FloorDiv],
+    ast.Pow: [ast.Mult],
+}
+
+_COMPARISON_REPLACEMENTS: dict[type, list[type]] = {
+    ast.Lt: [ast.LtE, ast.Gt],
+    ast.LtE: [ast.Lt, ast.GtE],
+    ast.Gt: [ast.GtE, ast.Lt],
+    ast.GtE: [ast.Gt, ast.LtE],
+    ast.Eq: [ast.NotEq],
+    ast.NotEq: [ast.Eq],
+    ast.Is: [ast.IsNot],
+    ast.IsNot: [ast.Is],
+    ast.In: [ast.NotIn],
+    ast.NotIn: [ast.In],
+}
+
+_BOOLEAN_REPLACEMENTS: dict[type, list[type]] = {
+    ast.And: [ast.Or],
+    ast.Or: [ast.And],
+}
+
+_OPERATOR_SYMBOLS: dict[type, str] = {
+    ast.Add: "+",
+    ast.Sub: "-",
+    ast.Mult: "*",
+    ast.Div: "/",
+    ast.FloorDiv: "//",
+    ast.Mod: "%",
+    ast.Pow: "**",
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+    ast.Eq: "==",
+    ast.NotEq: "!=",
+    ast.Is: "is",
+    ast.IsNot: "is not",
+    ast.In: "in",
+    ast.NotIn: "not in",
+    ast.And: "and",
+    ast.Or: "or",
+}
+
+
+@dataclass
+class _MutationSite:
+    """
+    A single in-memory mutation: `node` (found at `parent.field[index]`) gets
+    replaced by `build(node)` while the mutant is active.
+    """
+
+    mutant: Mutant
+    function: ast.AST
+    parent: ast.AST
+    field: str
+    index: Optional[int]
+    node: ast.AST
+    build: Callable[[ast.AST], ast.AST]
+    statement_line: int
+
+    def apply(self) -> None:
+        replacement = ast.copy_location(self.build(self.node), self.node)
+        ast.fix_missing_locations(replacement)
+        self._set(replacement)
+
+    def restore(self) -> None:
+        self._set(self.node)
+
+    def _set(self, value: ast.AST) -> None:
+        if self.index is None:
+            setattr(self.parent, self.field, value)
+        else:
+            getattr(self.parent, self.field)[self.index] = value
+
+
+def _swap_op(node: ast.AST, new_op: type) -> ast.AST:
+    mutated = copy.copy(node)
+    mutated.op = new_op()
+    return mutated
+
+
+def _swap_compare_op(node: ast.Compare, index: int, new_op: type) -> ast.AST:
+    mutated = copy.copy(node)
+    mutated.ops = list(node.ops)
+    mutated.ops[index] = new_op()
+    return mutated
+
+
+class _SiteCollector:
+    """
+    Walks the bodies of top-level functions and methods of top-level classes and
+    records every place one of the supported operators can be applied.
+    """
+
+    def __init__(self, filename: str = "") -> None:
+        self._filename = filename
+        self.sites: list[_MutationSite] = []
+        self._function: Optional[ast.AST] = None
+        self._qualname = ""
+        self._statement_line = 0
+
+    def collect(self, tree: ast.Module) -> list[_MutationSite]:
+        for node in tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self._collect_function(node, node.name)
+            elif isinstance(node, ast.ClassDef):
+                for member in node.body:
+                    if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        self._collect_function(member, f"{node.name}.{member.name}")
+        return self.sites
+
+    def _collect_function(self, function: ast.AST, qualname: str) -> None:
+        self._function = function
+        self._qualname = qualname
+        # only the body ends up in the function's code object, decorators and
+        # default values are evaluated once at definition time
+        body = function.body
+        for index, statement in enumerate(body):
+            if index == 0 and _is_docstring(statement):
+                continue
+            self._visit(statement, function, "body", index)
+
+    def _visit(self, node: ast.AST, parent: ast.AST, field: str, index) -> None:
+        if isinstance(node, (ast.JoinedStr, *_PATTERN_NODES)):
+            return
+        if isinstance(node, ast.stmt):
+            outer_statement_line = self._statement_line
+            self._statement_line = node.lineno
+            self._visit_children(node, parent, field, index)
+            self._statement_line = outer_statement_line
+        else:
+            self._visit_children(node, parent, field, index)
+
+    def _visit_children(self, node: ast.AST, parent: ast.AST, field: str, index) -> None:
+        self._mutations_for(node, parent, field, index)
+        for child_field, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                for child_index, child in enumerate(value):
+                    if isinstance(child, ast.AST):
+                        if _is_docstring(child) and child_index == 0 and isinstance(
+                            node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+                        ):
+                            continue
+                        self._visit(child, node, child_field, child_index)
+            elif isinstance(value, ast.AST):
+                self._visit(value, node, child_field, None)
+
+    def _mutations_for(self, node: ast.AST, parent: ast.AST, field: str, index) -> None:
+        if isinstance(node, (ast.BinOp, ast.AugAssign)):
+            for new_op in _ARITHMETIC_REPLACEMENTS.get(type(node.op), []):
+                self._add(
+                    node, parent, field, index, Operator.ARITHMETIC,
+                    f"{_OPERATOR_SYMBOLS[type(node.op)]} -> {_OPERATOR_SYMBOLS[new_op]}",
+                    lambda n, new_op=new_op: _swap_op(n, new_op),
+                )
+        elif isinstance(node, ast.Compare):
+            for op_index, op in enumerate(node.ops):
+                for new_op in _COMPARISON_REPLACEMENTS.get(type(op), []):
+                    self._add(
+                        node, parent, field, index, Operator.COMPARISON,
+                        f"{_OPERATOR_SYMBOLS[type(op)]} -> {_OPERATOR_SYMBOLS[new_op]}",
+                        lambda n, i=op_index, new_op=new_op: _swap_compare_op(n, i, new_op),
+                    )
+        elif isinstance(node, ast.BoolOp):
+            for new_op in _BOOLEAN_REPLACEMENTS.get(type(node.op), []):
+                self._add(
+                    node, parent, field, index, Operator.BOOLEAN,
+                    f"{_OPERATOR_SYMBOLS[type(node.op)]} -> {_OPERATOR_SYMBOLS[new_op]}",
+                    lambda n, new_op=new_op: _swap_op(n, new_op),
+                )
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            self._add(
+                node, parent, field, index, Operator.BOOLEAN,
+                "remove not", lambda n: copy.copy(n.operand),
+            )
+        elif isinstance(node, ast.Constant):
+            for value in _constant_replacements(node.value):
+                self._add(
+                    node, parent, field, index, Operator.CONSTANT,
+                    f"{node.value!r} -> {value!r}",
+                    lambda n, value=value: ast.Constant(value=value),
+                )
+
+        if (
+            isinstance(parent, ast.Return)
+            and field == "value"
+            and not (isinstance(node, ast.Constant) and node.value is None)
+        ):
+            self._add(
+                node, parent, field, index, Operator.RETURN,
+                "return value -> None", lambda n: ast.Constant(value=None),
+            )
+
+    def _add(self, node, parent, field, index, operator, description, build) -> None:
+        mutant = Mutant(
+            id=len(self.sites) + 1,
+            function=self._qualname,
+            line=node.lineno,
+            col=node.col_offset,
+            operator=operator,
+            description=description,
+            file=self._filename,
+        )
+        self.sites.append(
+            _MutationSite(
+                mutant, self._function, parent, field, index, node, build,
+                self._statement_line,
+            )
+        )
+
+
+# what compiling a mutated function raises when the mutation made it invalid
+_COMPILE_ERRORS = (RuntimeError, SyntaxError, ValueError, TypeError)
+# match patterns only allow literals and names, `case 1 + 2j` cannot become `case 1 * 2j`
+_PATTERN_NODES = (ast.pattern,) if hasattr(ast, "pattern") else ()
+
+
+def _is_docstring(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.Expr)
+        and isinstance(node.value, ast.Constant)
+        and isinstance(node.value.value, str)
+    )
+
+
+def _constant_replacements(value: Any) -> list[Any]:
+    if isinstance(value, bool):
+        return [not value]
+    if isinstance(value, (int, float)):
+        return [value + 1, value - 1]
+    if isinstance(value, str) and value:
+        return [""]
+    return []
+
+
+def _find_code(code: CodeType, name: str, firstlineno: int) -> Optional[CodeType]:
+    for const in code.co_consts:
+        if not isinstance(const, CodeType):
+            continue
+        if const.co_name == name and const.co_firstlineno == firstlineno:
+            return const
+        found = _find_code(const, name, firstlineno)
+        if found is not None:
+            return found
+    return None
+
+
+class _MutantTimeout(BaseException):
+    # not an Exception, so `except Exception:` in the mutated code cannot swallow it
+    pass
+
+
+DEFAULT_TIMEOUT_FACTOR = 5.0
+DEFAULT_TIMEOUT_CONSTANT = 1.0
+# how much longer than its own timeout a worker gets before it is killed from outside
+_WORKER_GRACE_PERIOD = 2.0
+TEST_STATS_FILE = "test_stats.json"
+
+
+class _MutantExecutor:
+    """
+    Holds the imported target and test modules and runs mutants against them
+    by swapping the `__code__` of the live functions. The test module keeps
+    references to the very same function objects, so no re-import is needed.
+    """
+
+    def __init__(
+        self,
+        target_module: str,
+        test_module: str,
+        timeout_factor: float = DEFAULT_TIMEOUT_FACTOR,
+        timeout_constant: float = DEFAULT_TIMEOUT_CONSTANT,
+        stats: Optional[TestStatistics] = None,
+        functions: Optional[list[str]] = None,
+        schemata: bool = False,
+        test_ids: Optional[list[str]] = None,
+    ) -> None:
+        self.unit_tests = UnitTests(stats)
+        self._target = importlib.import_module(target_module)
+        # the test file may have been rewritten since an earlier run in this process
+        self._test_module = self.unit_tests.import_fresh(test_module)
+        self._timeout_factor = timeout_factor
+        self._timeout_constant = timeout_constant
+        # per-test timings of the unmutated run, set by run_baseline
+        self.durations: dict[str, float] = {}
+
+        filename = inspect.getsourcefile(self._target)
+        if filename is None:
+            raise RuntimeError(f"Could not find source file for {target_module}")
+        self._filename = filename
+        with open(filename, "r") as file:
+            self._tree = ast.parse(file.read(), filename)
+
+        self._classes: dict[int, ast.ClassDef] = {}
+        for node in self._tree.body:
+            if isinstance(node, ast.ClassDef):
+                for member in node.body:
+                    self._classes[id(member)] = node
+
+        self._functions: dict[str, Optional[FunctionType]] = {}
+        self._sites: dict[int, _MutationSite] = {}
+        for site in _SiteCollector(filename).collect(self._tree):
+            if functions is not None and site.mutant.function not in functions:
+                continue
+            if self._resolve(site) is not None:
+                self._sites[site.mutant.id] = site
+
+        # qualified name -> code object holding every mutant of the function at once
+        self._schemata: dict[str, CodeType] = {}
+        if schemata:
+            self._build_schemata()
+
+        self._tests = list(
+            iter_tests(unittest.TestLoader().loadTestsFromModule(self._test_module))
+        )
+        if test_ids is not None:
+            self._tests = [test for test in self._tests if test.id() in test_ids]
+        self.coverage: Optional[CoverageIndex] = None
+        self._hashes: dict[str, str] = {}
+
+    @property
+    def mutants(self) -> list[Mutant]:
+        return [site.mutant for site in self._sites.values()]
+
+    @property
+    def tests(self) -> list[unittest.TestCase]:
+        return list(self._tests)
+
+    def run_baseline(self, collect_coverage: bool = False) -> float:
+        """
+        Runs the unmutated suite once. Mutation testing against a failing suite is meaningless.
+        With `collect_coverage` the run is traced and every mutant afterwards only
+        runs the tests that execute its line.
+        """
+        start = time.perf_counter()
+        if collect_coverage:
+            result, self.coverage = run_with_coverage(self._tests, {self._filename})
+        else:
+            result = self._run_tests(self._tests)
+        duration = time.perf_counter() - start
+        if not result.wasSuccessful():
+            raise RuntimeError(
+                f"Tests in {self._test_module.__name__} fail without any mutation"
+            )
+        self.durations = result.durations
+        self.unit_tests.stats.record_durations(result.durations)
+        return duration
+
+    def timeout_for(self, mutant_id: int) -> float:
+        """
+        Adaptive timeout: a multiple of how long the mutant's tests took on the
+        unmutated code, plus a constant to absorb noise on very fast suites.
+        """
+        tests = self._select_tests(self._sites[mutant_id])
+        baseline = sum(self.durations.get(test.id(), 0.0) for test in tests)
+        return self._timeout_factor * baseline + self._timeout_constant
+
+    def execute(self, mutant_id: int) -> MutantResult:
+        site = self._sites[mutant_id]
+        tests = self._select_tests(site)
+        if not tests:
+            return MutantResult(site.mutant, MutationStatus.UNCOVERED, 0.0)
+
+        tests = self.unit_tests.order_tests(tests, site.mutant.operator.value)
+        live = self._functions[site.mutant.function]
+        assert live is not None
+        original_code = live.__code__
+
+        schema = self._schemata.get(site.mutant.function)
+        if schema is not None:
+            # the schema stays installed, with no active mutant it runs the original code
+            original_code = schema
+            live.__code__ = schema
+            live.__globals__[ACTIVE_MUTANT] = mutant_id
+        else:
+            site.apply()
+            try:
+                live.__code__ = self._compile(site.function, original_code)
+            except _COMPILE_ERRORS as error:
+                logging.debug(f"Mutant #{mutant_id} does not compile: {error}")
+                return MutantResult(site.mutant, MutationStatus.STILLBORN, 0.0)
+            finally:
+                site.restore()
+
+        start = time.perf_counter()
+        try:
+            result = self._run_tests(
+                tests, self.timeout_for(mutant_id), failfast=True
+            )
+        finally:
+            live.__code__ = original_code
+            if schema is not None:
+                live.__globals__[ACTIVE_MUTANT] = 0
+        duration = time.perf_counter() - start
+
+        if getattr(result, "timed_out", False):
+            return MutantResult(
+                site.mutant, MutationStatus.TIMEOUT, duration,
+                test_durations=result.durations,
+            )
+        broken = result.failures + result.errors
+        if broken:
+            return MutantResult(
+                site.mutant, MutationStatus.KILLED, duration, broken[0][0].id(),
+                test_durations=result.durations,
+            )
+        return MutantResult(
+            site.mutant, MutationStatus.SURVIVED, duration,
+            test_durations=result.durations,
+        )
+
+    def prune(
+        self, pruner: MutantPruner, mutant_ids: Optional[set[int]] = None
+    ) -> PruneReport:
+        """
+        Compiles every mutant (of `mutant_ids`, when given) without running it and
+        lets `pruner` decide which ones are not worth executing.
+        """
+        candidates = []
+        original_codes: dict[str, CodeType] = {}
+        for site in self._sites.values():
+            if mutant_ids is not None and site.mutant.id not in mutant_ids:
+                continue
+            live = self._functions[site.mutant.function]
+            assert live is not None
+            qualname = site.mutant.function
+            if qualname not in original_codes:
+                # compiled the same way as the mutants, so only the mutation differs
+                original_codes[qualname] = self._compile(site.function, live.__code__)
+            site.apply()
+            try:
+                code: Optional[CodeType] = self._compile(site.function, live.__code__)
+            except _COMPILE_ERRORS:
+                code = None
+            finally:
+                site.restore()
+            candidates.append(
+                PruneCandidate(
+                    mutant_id=site.mutant.id,
+                    function=qualname,
+                    function_node=site.function,
+                    node=site.node,
+                    mutated=site.build(site.node),
+                    operator=site.mutant.operator.value,
+                    code=code,
+                    original_code=original_codes[qualname],
+                )
+            )
+        return pruner.prune(candidates)
+
+    def cache_key(self, mutant_id: int) -> str:
+        """
+        Content hash identifying a mutant's outcome: the normalized AST of the mutated
+        function, the mutant's operator and position within that function, and the
+        source of every test class that gets to run against it.
+        """
+        site = self._sites[mutant_id]
+        function_sites = [
+            other for other in self._sites.values() if other.function is site.function
+        ]
+        digest = hashlib.sha256()
+        digest.update(self._function_hash(site).encode())
+        digest.update(
+            f"{site.mutant.operator.value}:{site.mutant.description}:"
+            f"{function_sites.index(site)}".encode()
+        )
+        for test_id, test_hash in sorted(
+            (test.id(), self._test_hash(test)) for test in self._select_tests(site)
+        ):
+            digest.update(f"{test_id}:{test_hash}".encode())
+        return digest.hexdigest()
+
+    def _function_hash(self, site: _MutationSite) -> str:
+        key = site.mutant.function
+        if key not in self._hashes:
+            # line and column attributes are left out so moving a function around keeps its hash
+            dump = ast.dump(site.function, include_attributes=False)
+            self._hashes[key] = hashlib.sha256(f"{key}:{dump}".encode()).hexdigest()
+        return self._hashes[key]
+
+    def _test_hash(self, test: unittest.TestCase) -> str:
+        test_class = type(test)
+        key = f"{test_class.__module__}.{test_class.__qualname__}"
+        if key not in self._hashes:
+            try:
+                source = inspect.getsource(test_class)
+            except (OSError, TypeError):
+                source = key
+            self._hashes[key] = hashlib.sha256(source.encode()).hexdigest()
+        return self._hashes[key]
+
+    def _select_tests(self, site: _MutationSite) -> list[unittest.TestCase]:
+        if self.coverage is None:
+            return self._tests
+        covering = self.coverage.tests_for(
+            self._filename, site.mutant.line, site.statement_line
+        )
+        return [test for test in self._tests if test.id() in covering]
+
+    def _run_tests(
+        self,
+        tests: list[unittest.TestCase],
+        timeout: Optional[float] = None,
+        failfast: bool = False,
+    ) -> TimedTestResult:
+        result = TimedTestResult()
+        # one failing test is enough to kill a mutant, there is no point running the rest
+        result.failfast = failfast
+        # a TestSuite drops its tests after running them, so build a fresh one every time
+        suite = unittest.TestSuite(tests)
+        if not timeout or not _can_use_alarm():
+            suite.run(result)
+            return result
+
+        def on_alarm(signum, frame):
+            result.timed_out = True
+            result.stop()
+            raise _MutantTimeout()
+
+        previous = signal.signal(signal.SIGALRM, on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            suite.run(result)
+        except _MutantTimeout:
+            pass
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+        return result
+
+    def _build_schemata(self) -> None:
+        """
+        Compiles every mutated function once into a schema holding all of its mutants.
+        Functions whose schema does not compile (e.g. a mutated constant in a `match`
+        pattern, where no expression may go) keep being recompiled per mutant.
+        """
+        sites_by_function: dict[str, list[_MutationSite]] = {}
+        for site in self._sites.values():
+            sites_by_function.setdefault(site.mutant.function, []).append(site)
+
+        for qualname, sites in sites_by_function.items():
+            live = self._functions[qualname]
+            assert live is not None
+            schema = build_schema(
+                sites[0].function,
+                [(site.mutant.id, site.node, site.build) for site in sites],
+            )
+            try:
+                self._schemata[qualname] = self._compile(
+                    schema, live.__code__, parsed=sites[0].function
+                )
+            except _COMPILE_ERRORS as error:
+                logging.debug(f"No schema for {qualname}, mutating it per mutant: {error}")
+                continue
+            live.__globals__.setdefault(ACTIVE_MUTANT, 0)
+
+    def _compile(
+        self, function: ast.AST, original_code: CodeType, parsed: Optional[ast.AST] = None
+    ) -> CodeType:
+        """
+        Compiles `function` and returns the code object replacing `original_code`.
+        `parsed` is the node of the function in the parsed module when `function` is a
+        rewritten copy of it.
+        """
+        wrapper = function
+        class_node = self._classes.get(id(parsed if parsed is not None else function))
+        if class_node is not None:
+            # compile methods inside their class so `super()` gets its `__class__` cell
+            wrapper = ast.copy_location(
+                ast.ClassDef(
+                    name=class_node.name,
+                    bases=[],
+                    keywords=[],
+                    body=[function],
+                    decorator_list=[],
+                ),
+                class_node,
+            )
+        code = compile(ast.Module(body=[wrapper], type_ignores=[]), self._filename, "exec")
+        found = _find_code(code, original_code.co_name, original_code.co_firstlineno)
+        if found is None or found.co_freevars != original_code.co_freevars:
+            raise RuntimeError(f"Could not compile a replacement for {original_code.co_name}")
+        return found
+
+    def _resolve(self, site: _MutationSite) -> Optional[FunctionType]:
+        """
+        Find the live function object a site belongs to. Returns None for functions
+        whose code cannot be swapped in place (e.g. hidden behind an unknown decorator).
+        """
+        qualname = site.mutant.function
+        if qualname in self._functions:
+            return self._functions[qualname]
+
+        owner: Any = self._target
+        *path, name = qualname.split(".")
+        for part in path:
+            owner = getattr(owner, part, None)
+        member = vars(owner).get(name) if owner is not None else None
+        member = getattr(member, "__func__", member)
+        if isinstance(member, FunctionType):
+            member = inspect.unwrap(member)
+        if not isinstance(member, FunctionType) or member.__code__.co_name != name:
+            member = None
+        else:
+            try:
+                self._compile(site.function, member.__code__)
+            except RuntimeError:
+                logging.debug(f"Skipping {qualname}: its code cannot be swapped in place")
+                member = None
+
+        self._functions[qualname] = member
+        return member
+
+
+def _can_use_alarm() -> bool:
+    return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+
+def _worker_main(
+    target_module: str,
+    test_module: str,
+    timeout_factor: float,
+    timeout_constant: float,
+    durations: dict[str, float],
+    coverage: Optional[CoverageIndex],
+    stats: TestStatistics,
+    functions: Optional[list[str]],
+    schemata: bool,
+    test_ids: Optional[list[str]],
+    connection: Connection,
+) -> None:
+    """
+    Entry point of a persistent pool worker. The target and test modules are
+    imported once, then the worker runs whatever mutant ID it is handed until it
+    receives `None`. The parent hands the next ID to whichever worker reports
+    back first, so fast workers end up doing more of the work.
+
+    Every worker talks to the parent over its own pipe. A worker killed in the
+    middle of a mutant cannot leave a lock held on a queue shared with the others.
+    """
+    try:
+        executor = _MutantExecutor(
+            target_module,
+            test_module,
+            timeout_factor,
+            timeout_constant,
+            stats,
+            functions,
+            schemata,
+            test_ids,
+        )
+        executor.durations = durations
+        executor.coverage = coverage
+    except Exception as error:
+        connection.send(("error", f"Worker failed to load {target_module}: {error}"))
+        return
+
+    while True:
+        mutant_id = connection.recv()
+        if mutant_id is None:
+            break
+        try:
+            result = executor.execute(mutant_id)
+        except Exception as error:
+            connection.send(("error", f"Mutant #{mutant_id} could not be executed: {error}"))
+            continue
+        connection.send(("result", result))
+        if result.status == MutationStatus.TIMEOUT:
+            # the interrupted test may have left the process in any state
+            break
+
+
+@dataclass
+class _ForkedMutant:
+    pid: int
+    fd: int
+    mutant: Mutant
+    started_at: float
+    timeout: float
+    chunks: list[bytes] = field(default_factory=list)
+
+
+def _run_in_child(executor: "_MutantExecutor", mutant_id: int, fd: int) -> None:
+    """
+    Body of a forked child: run the mutant, write the pickled outcome to `fd` and
+    exit without running any of the parent's cleanup.
+    """
+    status = 0
+    try:
+        try:
+            message: tuple = ("result", executor.execute(mutant_id))
+        except Exception as error:
+            message = ("error", f"Mutant #{mutant_id} could not be executed: {error}")
+        payload = pickle.dumps(message)
+        view = memoryview(payload)
+        while view:
+            view = view[os.write(fd, view):]
+    except BaseException:
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+
+def _until(mutants: Iterable[Mutant], stop: Callable[[], bool]) -> Iterator[Mutant]:
+    """The mutants, until `stop` returns True before the next one is handed out."""
+    for mutant in mutants:
+        if stop():
+            return
+        yield mutant
+
+
+@dataclass
+class _Worker:
+    process: multiprocessing.process.BaseProcess
+    connection: Connection
+    # the mutant the worker is running, when it got it and how long it may take
+    mutant: Optional[Mutant] = None
+    started_at: float = 0.0
+    timeout: float = 0.0
+
+
+class ASTMutationRunner(MutationRunner):
+    """
+    Runs mutation testing in-process. The target module is parsed once with `ast`,
+    every mutant is compiled straight to a code object and swapped into the live
+    module, so there is no interpreter startup or re-import per mutant.
+    """
+
+    def __init__(
+        self,
+        target_module,
+        test_module,
+        jobs: Optional[int] = 1,
+        coverage: bool = True,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        timeout_factor: float = DEFAULT_TIMEOUT_FACTOR,
+        timeout_constant: float = DEFAULT_TIMEOUT_CONSTANT,
+        functions: Optional[list[str]] = None,
+        pruner: Optional[MutantPruner] = None,
+        schemata: bool = False,
+        execution: ExecutionMode = ExecutionMode.POOL,
+    ):
+        super().__init__(
+            self._convert_path_to_module(target_module),
+            self._convert_path_to_module(test_module),
+        )
+        self._timeout_factor = timeout_factor
+        self._timeout_constant = timeout_constant
+        # None means one worker per CPU
+        self._jobs = jobs if jobs is not None else (os.cpu_count() or 1)
+        self._coverage = coverage
+        self._cache_dir = cache_dir
+        # qualified names of the functions to mutate, all of them when None
+        self._functions = functions
+        # drops equivalent and redundant mutants before they run, None keeps all of them
+        self._pruner = pruner
+        # compile all mutants of a function into one schema and switch between them by ID
+        self._schemata = schemata
+        if execution == ExecutionMode.FORK and not hasattr(os, "fork"):
+            logging.warning("os.fork is not available, running mutants in a worker pool")
+            execution = ExecutionMode.POOL
+        self._execution = execution
+
+    def run(
+        self,
+        on_result: Optional[Callable[[MutantResult], None]] = None,
+        mutant_ids: Optional[Iterable[int]] = None,
+        test_ids: Optional[Iterable[str]] = None,
+        sampler: Optional[MutantSampler] = None,
+    ) -> MutationReport:
+        """
+        Runs all mutants and returns the report. `on_result` is called for every
+        mutant as soon as its result is known, in completion order.
+
+        `mutant_ids` and `test_ids` restrict the run to those mutants and tests, e.g. to
+        re-run only the survivors of an earlier run against only newly added tests.
+        With a `sampler` only a random sample of the mutants runs, within its budgets.
+        """
+        start = time.perf_counter()
+        stats = TestStatistics(
+            os.path.join(self._cache_dir, TEST_STATS_FILE) if self._cache_dir else None
+        )
+        executor = _MutantExecutor(
+            self._target_module,
+            self._test_module,
+            self._timeout_factor,
+            self._timeout_constant,
+            stats,
+            self._functions,
+            self._schemata,
+            list(test_ids) if test_ids is not None else None,
+        )
+        executor.run_baseline(collect_coverage=self._coverage)
+
+        report = MutationReport(target=self._target_module)
+        candidates = executor.mutants
+        selected = set(mutant_ids) if mutant_ids is not None else None
+        if selected is not None:
+            candidates = [mutant for mutant in candidates if mutant.id in selected]
+        if self._pruner is not None:
+            report.pruned = executor.prune(self._pruner, selected)
+            logging.info(report.pruned.summary())
+            candidates = [
+                mutant for mutant in candidates if mutant.id not in report.pruned.pruned
+            ]
+        if sampler is not None:
+            candidates = sampler.start(candidates)
+            report.sample = sampler.info
+        cache = MutationCache(self._cache_dir) if self._cache_dir else None
+        keys: dict[int, str] = {}
+
+        def collect(result: MutantResult) -> None:
+            mutant = result.mutant
+            logging.debug(
+                f"Mutant #{mutant.id} {mutant.function}:{mutant.line} "
+                f"[{mutant.operator.value}] {mutant.description}: {result.status.value}"
+            )
+            if not result.cached:
+                stats.record_mutant(
+                    mutant.operator.value, result.test_durations.keys(), result.killed_by
+                )
+            if cache is not None and not result.cached:
+                cache.put(
+                    keys[mutant.id],
+                    CachedResult(result.status.value, result.duration, result.killed_by),
+                )
+            report.results.append(result)
+            if sampler is not None and result.status != MutationStatus.STILLBORN:
+                sampler.record(result)
+            if on_result is not None:
+                on_result(result)
+
+        try:
+            mutants = []
+            for mutant in candidates:
+                if cache is None:
+                    mutants.append(mutant)
+                    continue
+                keys[mutant.id] = executor.cache_key(mutant.id)
+                cached = cache.get(keys[mutant.id])
+                if cached is None:
+                    mutants.append(mutant)
+                else:
+                    collect(
+                        MutantResult(
+                            mutant,
+                            MutationStatus(cached.status),
+                            cached.duration,
+                            cached.killed_by,
+                            cached=True,
+                        )
+                    )
+
+            jobs = min(self._jobs, len(mutants))
+            logging.info(
+                f"Running {len(mutants)} mutants of {self._target_module} with {max(jobs, 1)} job(s)"
+                + (f", {cache.hits} taken from the cache" if cache is not None else "")
+            )
+            pending = mutants if sampler is None else _until(mutants, sampler.should_stop)
+            if self._execution == ExecutionMode.FORK and mutants:
+                self._run_forked(pending, max(jobs, 1), executor, collect)
+            elif mutants:
+                # a single job runs in a worker too, so a mutant the alarm cannot stop is
+                # still killed from outside
+                self._run_parallel(pending, max(jobs, 1), executor, collect)
+        finally:
+            stats.save()
+            if cache is not None:
+                cache.close()
+
+        report.results.sort(key=lambda result: result.mutant.id)
+        report.duration = time.perf_counter() - start
+        return report
+
+    def _run_parallel(
+        self,
+        mutants: Iterable[Mutant],
+        jobs: int,
+        executor: _MutantExecutor,
+        collect: Callable[[MutantResult], None],
+    ) -> None:
+        context = multiprocessing.get_context()
+        pending = iter(mutants)
+        workers: list[_Worker] = []
+
+        def spawn() -> _Worker:
+            parent_end, child_end = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(
+                    self._target_module,
+                    self._test_module,
+                    self._timeout_factor,
+                    self._timeout_constant,
+                    executor.durations,
+                    executor.coverage,
+                    executor.unit_tests.stats,
+                    self._functions,
+                    self._schemata,
+                    [test.id() for test in executor.tests],
+                    child_end,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child_end.close()
+            worker = _Worker(process, parent_end)
+            workers.append(worker)
+            return worker
+
+        def retire(worker: _Worker) -> None:
+            workers.remove(worker)
+            worker.connection.close()
+            worker.process.join(timeout=1)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+
+        def dispatch(worker: _Worker) -> None:
+            mutant = next(pending, None)
+            worker.mutant = mutant
+            if mutant is None:
+                return
+            worker.started_at = time.monotonic()
+            # the alarm inside the worker fires at this timeout, the parent only steps in after a grace period
+            worker.timeout = executor.timeout_for(mutant.id)
+            worker.connection.send(mutant.id)
+
+        for _ in range(jobs):
+            dispatch(spawn())
+
+        try:
+            while any(worker.mutant is not None for worker in workers):
+                ready = wait([worker.connection for worker in workers], timeout=0.5)
+                for worker in list(workers):
+                    if worker.connection not in ready:
+                        continue
+                    try:
+                        kind, payload = worker.connection.recv()
+                    except EOFError:
+                        self._replace_dead_worker(worker, retire, spawn, dispatch, collect)
+                        continue
+                    if kind == "error":
+                        raise RuntimeError(payload)
+                    worker.mutant = None
+                    collect(payload)
+                    if payload.status == MutationStatus.TIMEOUT:
+                        retire(worker)
+                        worker = spawn()
+                    dispatch(worker)
+                self._kill_hung_workers(workers, retire, spawn, dispatch, collect)
+        finally:
+            for worker in list(workers):
+                try:
+                    worker.connection.send(None)
+                except OSError:
+                    pass
+                retire(worker)
+
+    def _run_forked(
+        self,
+        mutants: Iterable[Mutant],
+        jobs: int,
+        executor: _MutantExecutor,
+        collect: Callable[[MutantResult], None],
+    ) -> None:
+        """
+        Forks the fully loaded process once per mutant, up to `jobs` at a time. Each
+        child starts from a pristine copy of the modules, so whatever global state a
+        mutant corrupts dies with it. Results come back pickled over a pipe.
+        """
+        pending = iter(mutants)
+        running: dict[int, _ForkedMutant] = {}
+
+        def fork_next() -> None:
+            mutant = next(pending, None)
+            if mutant is None:
+                return
+            timeout = executor.timeout_for(mutant.id)
+            read_fd, write_fd = os.pipe()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                _run_in_child(executor, mutant.id, write_fd)
+            os.close(write_fd)
+            running[read_fd] = _ForkedMutant(pid, read_fd, mutant, time.monotonic(), timeout)
+
+        def finish(child: _ForkedMutant, killed: bool = False) -> None:
+            del running[child.fd]
+            os.close(child.fd)
+            if killed:
+                os.kill(child.pid, signal.SIGKILL)
+            os.waitpid(child.pid, 0)
+            fork_next()
+
+        for _ in range(jobs):
+            fork_next()
+
+        try:
+            while running:
+                ready, _, _ = select.select(list(running), [], [], 0.5)
+                for fd in ready:
+                    child = running[fd]
+                    chunk = os.read(fd, 65536)
+                    if chunk:
+                        child.chunks.append(chunk)
+                        continue
+                    finish(child)
+                    duration = time.monotonic() - child.started_at
+                    try:
+                        kind, payload = pickle.loads(b"".join(child.chunks))
+                    except Exception:
+                        # the mutant took its process down with it, which counts as noticed
+                        logging.debug(f"Mutant #{child.mutant.id} crashed its process")
+                        collect(MutantResult(child.mutant, MutationStatus.KILLED, duration))
+                        continue
+                    if kind == "error":
+                        raise RuntimeError(payload)
+                    collect(payload)
+
+                now = time.monotonic()
+                for child in list(running.values()):
+                    elapsed = now - child.started_at
+                    if elapsed < child.timeout + _WORKER_GRACE_PERIOD:
+                        continue
+                    logging.warning(f"Mutant #{child.mutant.id} hung its process, killing it")
+                    finish(child, killed=True)
+                    collect(MutantResult(child.mutant, MutationStatus.TIMEOUT, elapsed))
+        finally:
+            for child in list(running.values()):
+                os.close(child.fd)
+                os.kill(child.pid, signal.SIGKILL)
+                os.waitpid(child.pid, 0)
+
+    def _replace_dead_worker(self, worker, retire, spawn, dispatch, collect) -> None:
+        """
+        A mutant that takes its worker down with it (e.g. `os._exit`, a crash in an
+        extension) was evidently noticed, so it counts as killed.
+        """
+        logging.warning("Mutation worker exited unexpectedly, restarting it")
+        mutant = worker.mutant
+        retire(worker)
+        if mutant is not None:
+            duration = time.monotonic() - worker.started_at
+            collect(MutantResult(mutant, MutationStatus.KILLED, duration))
+        dispatch(spawn())
+
+    def _kill_hung_workers(self, workers, retire, spawn, dispatch, collect) -> None:
+        """
+        A mutant stuck outside of Python bytecode (e.g. in a C loop) never sees the
+        in-process alarm. Kill its worker, count the mutant as timed out and start
+        a replacement.
+        """
+        now = time.monotonic()
+        for worker in list(workers):
+            if worker.mutant is None:
+                continue
+            if now - worker.started_at < worker.timeout + _WORKER_GRACE_PERIOD:
+                continue
+            logging.warning(f"Mutant #{worker.mutant.id} hung its worker, restarting the worker")
+            retire(worker)
+            collect(MutantResult(worker.mutant, MutationStatus.TIMEOUT, now - worker.started_at))
+            dispatch(spawn())
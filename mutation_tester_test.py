@@ -0,0 +1,216 @@
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+from mutant_pruning import MutantPruner, PruneReason
+from mutation_tester import (
+    ASTMutationRunner,
+    ExecutionMode,
+    Mutant,
+    MutantResult,
+    MutationReport,
+    MutationStatus,
+    Operator,
+)
+
+MATCH_TARGET = """
+def classify(value):
+    match value:
+        case 1 + 2j:
+            return "complex"
+        case 0:
+            return "zero"
+    return "other" if value > 0 else "negative"
+"""
+
+MATCH_TESTS = """
+import unittest
+from .target import classify
+
+
+class TestClassify(unittest.TestCase):
+    def test_classify(self):
+        self.assertEqual(classify(1 + 2j), "complex")
+        self.assertEqual(classify(0), "zero")
+        self.assertEqual(classify(5), "other")
+        self.assertEqual(classify(-5), "negative")
+"""
+
+
+MIXED_TARGET = """
+def sign(x):
+    return "pos" if x > 0 else "neg"
+
+
+def scale(x):
+    y = x * 3
+    return y
+    y = y * 2
+
+
+def count_up(n):
+    i = 0
+    while i < n:
+        i += 1
+    return i
+"""
+
+MIXED_TESTS = """
+import unittest
+from .target import count_up, scale, sign
+
+
+class TestMixed(unittest.TestCase):
+    def test_sign(self):
+        self.assertEqual(sign(5), "pos")
+        self.assertEqual(sign(-5), "neg")
+
+    def test_scale(self):
+        self.assertEqual(scale(2), 6)
+
+    def test_count_up(self):
+        self.assertEqual(count_up(3), 3)
+"""
+
+
+class PackageTestCase(unittest.TestCase):
+    """Writes a target module and its tests to a package the runner can import."""
+
+    package = ""
+    target = ""
+    tests = ""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.directory = tempfile.TemporaryDirectory()
+        package = os.path.join(cls.directory.name, cls.package)
+        os.mkdir(package)
+        for name, source in [("__init__", ""), ("target", cls.target), ("target_test", cls.tests)]:
+            with open(os.path.join(package, f"{name}.py"), "w") as file:
+                file.write(textwrap.dedent(source))
+        # the runner takes paths relative to the working directory, like the CLI
+        cls.cwd = os.getcwd()
+        os.chdir(cls.directory.name)
+        sys.path.insert(0, cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.chdir(cls.cwd)
+        sys.path.remove(cls.directory.name)
+        cls.directory.cleanup()
+
+    def run_mutants(self, **options) -> MutationReport:
+        options = {"jobs": 1, "cache_dir": None, **options}
+        target, tests = f"{self.package}/target.py", f"{self.package}/target_test.py"
+        return ASTMutationRunner(target, tests, **options).run()
+
+
+class MatchPatternTest(PackageTestCase):
+    package = "matchpkg"
+    target = MATCH_TARGET
+    tests = MATCH_TESTS
+
+    def test_match_patterns_are_not_mutated(self):
+        scores = set()
+        for execution in ExecutionMode:
+            for schemata in (False, True):
+                with self.subTest(execution=execution, schemata=schemata):
+                    report = self.run_mutants(execution=execution, schemata=schemata)
+                    self.assertTrue(report.results)
+                    self.assertFalse(report.stillborn)
+                    scores.add(report.score)
+        self.assertEqual(len(scores), 1)
+
+    def test_match_patterns_with_pruning(self):
+        report = self.run_mutants(pruner=MutantPruner())
+        self.assertTrue(report.results)
+        self.assertNotIn(MutationStatus.STILLBORN, [result.status for result in report.results])
+
+
+class ASTMutationRunnerTest(PackageTestCase):
+    package = "mixedpkg"
+    target = MIXED_TARGET
+    tests = MIXED_TESTS
+    # count_up has mutants looping forever, which take a second each to time out
+    fast_functions = ["sign", "scale"]
+
+    def statuses(self, report: MutationReport) -> dict[tuple, MutationStatus]:
+        return {
+            (result.mutant.function, result.mutant.line, result.mutant.description): result.status
+            for result in report.results
+        }
+
+    def test_outcomes(self):
+        report = self.run_mutants(pruner=MutantPruner())
+        statuses = set(self.statuses(report).values())
+        self.assertTrue(
+            {MutationStatus.KILLED, MutationStatus.SURVIVED, MutationStatus.TIMEOUT} <= statuses
+        )
+        self.assertIn(PruneReason.DEAD_CODE, report.pruned.by_reason())
+
+    def test_executors_and_schemata_agree(self):
+        expected = self.statuses(self.run_mutants(functions=self.fast_functions))
+        for execution in ExecutionMode:
+            for schemata in (False, True):
+                with self.subTest(execution=execution, schemata=schemata):
+                    report = self.run_mutants(
+                        functions=self.fast_functions, execution=execution, schemata=schemata
+                    )
+                    self.assertEqual(self.statuses(report), expected)
+
+    def test_cached_results_are_reused_until_the_function_changes(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            options = {"functions": self.fast_functions, "cache_dir": cache_dir}
+            first = self.run_mutants(**options)
+            self.assertFalse(any(result.cached for result in first.results))
+            second = self.run_mutants(**options)
+            self.assertTrue(all(result.cached for result in second.results))
+
+            path = os.path.join(self.package, "target.py")
+            with open(path) as file:
+                source = file.read()
+            self.addCleanup(self.restore, path, source)
+            with open(path, "w") as file:
+                file.write(source.replace('"pos" if x > 0', '"pos" if x >= 1'))
+            cached = {
+                result.mutant.function: result.cached
+                for result in self.run_mutants(**options).results
+            }
+            self.assertFalse(cached["sign"])
+            self.assertTrue(cached["scale"])
+
+    def restore(self, path: str, source: str) -> None:
+        with open(path, "w") as file:
+            file.write(source)
+        sys.modules.pop(f"{self.package}.target", None)
+
+
+def result(mutant_id: int, status: MutationStatus) -> MutantResult:
+    mutant = Mutant(mutant_id, "f", 1, 0, Operator.ARITHMETIC, "+ -> -")
+    return MutantResult(mutant, status, 0.1)
+
+
+class MutationReportTest(unittest.TestCase):
+    def test_timeouts_are_kills_and_stillborn_mutants_are_not_scored(self):
+        report = MutationReport(
+            "target",
+            [
+                result(1, MutationStatus.KILLED),
+                result(2, MutationStatus.TIMEOUT),
+                result(3, MutationStatus.SURVIVED),
+                result(4, MutationStatus.STILLBORN),
+            ],
+        )
+        self.assertEqual(len(report.killed), 2)
+        self.assertEqual(len(report.survived), 1)
+        self.assertAlmostEqual(report.score, 2 / 3)
+        self.assertIn("1 stillborn", report.summary())
+
+    def test_timeout_status_of_earlier_runs_is_still_read(self):
+        self.assertEqual(MutationStatus("timeout"), MutationStatus.TIMEOUT)
+        self.assertEqual(MutationStatus.TIMEOUT.value, "killed (timeout)")
+
+
+if __name__ == "__main__":
+    unittest.main()
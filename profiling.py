@@ -0,0 +1,115 @@
+import contextlib
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+@dataclass
+class StageStats:
+    name: str
+    wall_time: float = 0.0
+    # of this process and of the child processes (mutation workers) it waited for
+    cpu_time: float = 0.0
+    # high-water mark of this process or any of its waited-for children, in KiB
+    peak_rss_kb: int = 0
+    # mutants, tests, ... processed by the stage, for the throughput
+    items: int = 0
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.wall_time if self.wall_time > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "items_per_second": self.items_per_second}
+
+
+class StageTimer:
+    """
+    Records wall time, CPU time and peak memory of the stages of a pipeline run:
+
+        timer = StageTimer()
+        with timer.stage("mutation") as stats:
+            report = runner.run()
+            stats.items = len(report.results)
+    """
+
+    def __init__(self) -> None:
+        self.stages: dict[str, StageStats] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[StageStats]:
+        stats = self.stages.setdefault(name, StageStats(name))
+        wall_start = time.perf_counter()
+        cpu_start = _cpu_time()
+        try:
+            yield stats
+        finally:
+            stats.wall_time += time.perf_counter() - wall_start
+            stats.cpu_time += _cpu_time() - cpu_start
+            stats.peak_rss_kb = max(stats.peak_rss_kb, _peak_rss_kb())
+
+    def summary(self) -> str:
+        lines = []
+        for stats in self.stages.values():
+            line = (
+                f"{stats.name}: {stats.wall_time:.3f}s wall, {stats.cpu_time:.3f}s CPU, "
+                f"peak RSS {stats.peak_rss_kb / 1024:.1f} MiB"
+            )
+            if stats.items:
+                line += f", {stats.items} items ({stats.items_per_second:.1f}/s)"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {name: stats.to_dict() for name, stats in self.stages.items()}
+
+
+@contextlib.contextmanager
+def profiled(output_file: Optional[str]) -> Iterator[None]:
+    """
+    Runs the block under cProfile and dumps the stats to `output_file` (for
+    `python -m pstats` or snakeviz), logging the top functions by cumulative time.
+    Does nothing when `output_file` is None.
+    """
+    if output_file is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_file)
+        top = io.StringIO()
+        pstats.Stats(profiler, stream=top).sort_stats("cumulative").print_stats(20)
+        logging.info(f"Profile written to {output_file}\n{top.getvalue()}")
+
+
+def _cpu_time() -> float:
+    if resource is None:
+        return time.process_time()
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _peak_rss_kb() -> int:
+    if resource is None:
+        return 0
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # macOS reports bytes, Linux KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
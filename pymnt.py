@@ -1,27 +1,147 @@
 import argparse
-import sys
-import inspect
 import logging
-from typing import Any, Callable
-from test_generator import OpenAITestGenerator, AnalysisResult
-from unit_tests import UnitTests
-from mutation_tester import MutPyRunner
-from fix_applier import FixApplier
-from util import exec_module
+import os
+import sys
+from typing import TYPE_CHECKING, Optional
+from discovery import FunctionLike, describe_function, discover_functions, function_by_name
+from llm_backend import DEFAULT_MODEL, BackendKind, LLMBackend, create_backend
+from llm_cache import DEFAULT_CACHE_DIR
+from mutation_sampling import DEFAULT_CONFIDENCE, parse_duration
+from profiling import StageTimer, profiled
+
+# the mutation engine, the LLM client and asyncio are only imported by the modes using them
+if TYPE_CHECKING:
+    from batch import BatchResult
+    from mutant_pruning import MutantPruner
+    from mutation_sampling import MutantSampler
+    from mutation_tester import MutantResult
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+# values of mutation_tester.ExecutionMode, spelled out so --help does not load the engine
+EXECUTORS = ("pool", "fork")
+
+
+def configure_logging(level: str, log_file: Optional[str]) -> None:
+    handlers: list[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if log_file is not None:
+        handlers.append(logging.FileHandler(log_file))
+    logging.basicConfig(level=level, format=LOG_FORMAT, handlers=handlers)
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("debug.log"), logging.StreamHandler(sys.stdout)],
-)
 
+def load_function(file_path: str, function_name: str) -> FunctionLike:
+    """
+    Finds the function by parsing the file. Only functions the parser cannot see,
+    like ones created at import time, are loaded by executing the module.
+    """
+    function = function_by_name(file_path, function_name)
+    if function is not None:
+        return function
+    from util import exec_module
 
-def load_function(file_path: str, function_name: str) -> Callable[..., Any]:
     module = exec_module(file_path)
     return getattr(module, function_name)
 
 
-MAX_ITERATIONS = 3
+def print_mutant_result(result: "MutantResult") -> None:
+    mutant = result.mutant
+    print(
+        f"[{result.status.value}] #{mutant.id} {mutant.function}:{mutant.line} "
+        f"{mutant.operator.value} {mutant.description}"
+    )
+
+
+def print_batch_result(result: "BatchResult") -> None:
+    function = result.function
+    if result.report is not None:
+        print(
+            f"{function.file}:{function.qualname}: mutation score {result.report.score:.1%} "
+            f"({len(result.report.killed)}/{len(result.report.scored)} killed)"
+        )
+    else:
+        print(f"{function.file}:{function.qualname}: {result.error}")
+
+
+def positive_int(text: str) -> int:
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {text}")
+    return value
+
+
+def positive_float(text: str) -> float:
+    value = float(text)
+    if not value > 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {text}")
+    return value
+
+
+def probability(text: str) -> float:
+    value = float(text)
+    if not 0 < value < 1:
+        raise argparse.ArgumentTypeError(f"must be between 0 and 1 (exclusive), got {text}")
+    return value
+
+
+def make_pruner(args: argparse.Namespace) -> Optional["MutantPruner"]:
+    if args.no_prune:
+        return None
+    from mutant_pruning import MutantPruner
+
+    return MutantPruner(representative=args.representative_mutants)
+
+
+def make_sampler(args: argparse.Namespace) -> Optional["MutantSampler"]:
+    if args.mutant_budget is None and args.time_budget is None and args.ci_width is None:
+        return None
+    from mutation_sampling import MutantSampler
+
+    return MutantSampler(
+        mutant_budget=args.mutant_budget,
+        time_budget=args.time_budget,
+        ci_width=args.ci_width,
+        seed=args.seed,
+        confidence=args.confidence,
+    )
+
+
+def make_backend(args: argparse.Namespace) -> LLMBackend:
+    return create_backend(
+        BackendKind(args.backend),
+        model=args.model,
+        base_url=args.base_url,
+        recordings_dir=args.recordings_dir,
+    )
+
+
+def run_batch_mode(args: argparse.Namespace) -> None:
+    import asyncio
+    from batch import run_batch
+    from mutation_tester import ExecutionMode
+
+    functions = discover_functions([args.file_path])
+    if not functions:
+        logging.error(f"No functions found in {args.file_path}")
+        sys.exit(1)
+    logging.info(f"Running pymnt on {len(functions)} functions from {args.file_path}")
+    results = asyncio.run(
+        run_batch(
+            functions,
+            jobs=args.jobs,
+            max_concurrency=args.concurrency,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            on_result=print_batch_result,
+            pruner=make_pruner(args),
+            schemata=args.schemata,
+            execution=ExecutionMode(args.executor),
+            report_dir=args.report_dir,
+            feedback_iterations=args.feedback_iterations,
+            backend=make_backend(args),
+            quiet_tests=args.quiet_tests,
+            sampler=make_sampler(args),
+        )
+    )
+    if any(result.report is None for result in results):
+        sys.exit(1)
 
 
 def main() -> None:
@@ -29,52 +149,253 @@ def main() -> None:
         description="Automated Testing Library with Mutation Testing"
     )
     parser.add_argument(
-        "file_path", help="Path to the Python file containing the function to test"
+        "file_path",
+        help="Path to the Python file containing the function to test. "
+        "Without a function name, a file, package directory or glob to test every function in",
+    )
+    parser.add_argument("function_name", nargs="?", help="Name of the function to test")
+    parser.add_argument(
+        "--jobs",
+        type=positive_int,
+        default=None,
+        help="Number of mutation testing workers (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--test-jobs",
+        type=positive_int,
+        default=1,
+        help="Shard the generated tests over this many forked workers when validating them, "
+        "balanced by their recorded durations (Unix only, default: %(default)s)",
+    )
+    parser.add_argument(
+        "--quiet-tests",
+        action="store_true",
+        help="Do not print every test when validating the generated tests",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=positive_int,
+        default=8,
+        help="Maximum number of LLM requests in flight in batch mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="Directory of the mutation result and LLM response caches (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Run every mutant and LLM request even if its result is cached",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=[kind.value for kind in BackendKind],
+        default=BackendKind.OPENAI.value,
+        help="Where completions come from: an OpenAI-compatible server (openai), the same while "
+        "saving every response to --recordings-dir (record), or only the saved responses, "
+        "failing on anything not recorded (replay) (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--model",
+        default=DEFAULT_MODEL,
+        help="Chat model to request (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=None,
+        help="OpenAI-compatible endpoint, e.g. a self-hosted model at http://localhost:8000/v1 "
+        "(default: OPENAI_BASE_URL or OpenAI). No API key is needed with a base URL",
+    )
+    parser.add_argument(
+        "--recordings-dir",
+        default=None,
+        help="Directory of the recorded responses for --backend record and replay "
+        "(default: <cache-dir>/recordings)",
+    )
+    parser.add_argument(
+        "--no-prune",
+        action="store_true",
+        help="Run every mutant, including equivalent, duplicate and dead-code ones",
+    )
+    parser.add_argument(
+        "--representative-mutants",
+        action="store_true",
+        help="Run only one mutant per expression and operator",
+    )
+    parser.add_argument(
+        "--schemata",
+        action="store_true",
+        help="Compile all mutants of a function into one schema and switch between them by ID",
+    )
+    parser.add_argument(
+        "--executor",
+        choices=EXECUTORS,
+        default=EXECUTORS[0],
+        help="Run mutants in persistent workers (pool) or each in its own fork of the "
+        "loaded modules, isolating global state (fork, Unix only) (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--mutant-budget",
+        type=positive_int,
+        default=None,
+        help="Run a random sample of at most N mutants, stratified by function and operator, "
+        "and report the score with a confidence interval",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=parse_duration,
+        default=None,
+        help="Stop sampling mutants after this long, e.g. 60s or 5m (per function in batch mode)",
+    )
+    parser.add_argument(
+        "--ci-width",
+        type=positive_float,
+        default=None,
+        help="Stop sampling mutants once the confidence interval of the score is narrower, "
+        "e.g. 0.1 for +-5 percentage points",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=probability,
+        default=DEFAULT_CONFIDENCE,
+        help="Confidence level of the interval of a sampled score (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed of the mutant sample, to reproduce an earlier run (default: random, logged)",
+    )
+    parser.add_argument(
+        "--report-dir",
+        default=None,
+        help="Stream mutation results to <dir>/events.jsonl as they finish and write a summary "
+        "and a diff against the previous run there (per function in batch mode)",
+    )
+    parser.add_argument(
+        "--feedback-iterations",
+        type=int,
+        default=None,
+        help="How often to ask for tests killing the surviving mutants, stopping early once "
+        "the score stops improving. 0 disables the feedback loop (default: 3)",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="INFO",
+        help="Log messages of this level and above to stdout (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--log-file",
+        default=None,
+        help="Also write the log to this file, nothing is written to disk by default",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="pymnt.prof",
+        default=None,
+        metavar="FILE",
+        help="Run under cProfile, dump the stats to FILE (default: pymnt.prof) and log "
+        "the time spent in every stage",
     )
-    parser.add_argument("function_name", help="Name of the function to test")
     args = parser.parse_args()
+    configure_logging(args.log_level, args.log_file)
+    if args.recordings_dir is None:
+        args.recordings_dir = os.path.join(args.cache_dir, "recordings")
+    if args.feedback_iterations is None:
+        from feedback_loop import MAX_FEEDBACK_ITERATIONS
+
+        args.feedback_iterations = MAX_FEEDBACK_ITERATIONS
+
+    timer = StageTimer()
+    try:
+        with profiled(args.profile):
+            if args.function_name is None:
+                with timer.stage("batch"):
+                    run_batch_mode(args)
+            else:
+                run_single_mode(args, timer)
+    finally:
+        if args.profile is not None:
+            logging.info(f"Stage timings:\n{timer.summary()}")
+
+
+def run_single_mode(args: argparse.Namespace, timer: StageTimer) -> None:
+    from feedback_loop import close_gaps
+    from llm_cache import default_response_cache
+    from mutation_report import MutationEventLog
+    from mutation_tester import TEST_STATS_FILE, ASTMutationRunner, ExecutionMode, MutantResult
+    from repair import RepairOutcome, repair_tests
+    from test_generator import OpenAITestGenerator
+    from unit_tests import TestStatistics, UnitTests
 
     function_to_test = load_function(args.file_path, args.function_name)
 
-    test_generator = OpenAITestGenerator(functions=[function_to_test])
-    unit_test_runner = UnitTests()
+    response_cache = None if args.no_cache else default_response_cache(args.cache_dir)
+    test_generator = OpenAITestGenerator(
+        functions=[function_to_test], cache=response_cache, backend=make_backend(args)
+    )
+    # the recorded durations decide whether the tests are worth sharding
+    test_stats = TestStatistics(
+        None if args.no_cache else os.path.join(args.cache_dir, TEST_STATS_FILE)
+    )
+    unit_test_runner = UnitTests(test_stats, jobs=args.test_jobs, quiet=args.quiet_tests)
     output_file = args.file_path.replace(".py", "_test.py")
-    mutation_runner = MutPyRunner(args.file_path, output_file)
-
-    for _ in range(MAX_ITERATIONS):
-        test_results = unit_test_runner.run_tests("examples/example_test.py")
-        if test_results.wasSuccessful():
-            break
-        else:
-            test_source_map = unit_test_runner.get_failed_tests_source(test_results)
-            # for now just get the first as we are running pymnt on only one function. func_source = inspect.getsource(function_to_test)
-            test_method = list(test_source_map.keys())[0]
-            test_source = test_source_map[test_method]
-            func_source = inspect.getsource(function_to_test)
-            result = test_generator.attempt_to_fix_test(func_source, test_source)
-            logging.info(
-                f"Fixing test: {result.result_type}, result: {result.suggestion}"
-            )
-            applier = FixApplier(result.suggestion)
-            if result.result_type == AnalysisResult.FUNC_FAULT:
-                logging.info(
-                    f"Function fault detected. Suggested fix: {result.suggestion}"
-                )
-                print(
-                    "Function fault detected. Suggested fix: ", result.suggestion
-                )  # just print the suggestion i guess ?
-                break
-            elif result.result_type == AnalysisResult.TEST_FAULT:
-                logging.info(f"Test fault detected. Suggested fix: {result.suggestion}")
-                applier.apply_test_fix(test_method)
-                continue  # run unit tests again
-            elif result.result_type == AnalysisResult.UNKNOWN_FAULT:
-                logging.info("Could not determine fault.Retrying...")
-    else:
-        logging.error("Max iterations reached. Exiting...")
+    mutation_runner = ASTMutationRunner(
+        args.file_path,
+        output_file,
+        jobs=args.jobs,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        pruner=make_pruner(args),
+        schemata=args.schemata,
+        execution=ExecutionMode(args.executor),
+    )
+
+    func_source = describe_function(function_to_test).source
+    with timer.stage("repair"):
+        outcome = repair_tests(test_generator, unit_test_runner, output_file, func_source)
+    if outcome != RepairOutcome.PASSED:
+        logging.error(f"Exiting, {outcome.value}")
         sys.exit(1)
     # MUTATION TESTING PART
-    mutation_runner.run()
+    event_log = None
+    if args.report_dir is not None:
+        event_log = MutationEventLog(args.report_dir, args.file_path)
+
+    def on_result(result: MutantResult) -> None:
+        print_mutant_result(result)
+        if event_log is not None:
+            event_log(result)
+
+    with timer.stage("mutation") as stats:
+        report = mutation_runner.run(on_result=on_result, sampler=make_sampler(args))
+        stats.items = len(report.results)
+    if args.feedback_iterations > 0:
+        # the summary is printed once, after the feedback loop changed the results
+        logging.info(f"Mutation score before the feedback loop: {report.score:.1%}")
+        with timer.stage("feedback") as stats:
+            stats.items = len(report.survived)
+            report = close_gaps(
+                test_generator,
+                mutation_runner,
+                unit_test_runner,
+                args.file_path,
+                output_file,
+                report,
+                max_iterations=args.feedback_iterations,
+                on_result=on_result,
+            )
+    print(report.summary())
+    if event_log is not None:
+        logging.info(event_log.finish(report).summary())
+    if response_cache is not None:
+        stats = response_cache.stats
+        logging.info(
+            f"LLM response cache: {stats.hits} hits, {stats.misses} misses "
+            f"({stats.hit_rate:.0%} hit rate)"
+        )
 
 
 if __name__ == "__main__":
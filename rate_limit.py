@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """
+    Async token bucket holding up to `capacity` tokens, refilled continuously so
+    that `capacity` tokens become available every `period` seconds.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0) -> None:
+        self._capacity = capacity
+        self._rate = capacity / period
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        # a single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self._capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self._rate)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated_at) * self._rate
+        )
+        self._updated_at = now
+
+
+class RateLimiter:
+    """
+    Bounds concurrent requests and keeps requests/min and tokens/min under the given limits.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ) -> None:
+        self._semaphore = asyncio.BoundedSemaphore(max_concurrency)
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    async def run(self, call: Callable[[], Awaitable[T]], tokens: float = 0.0) -> T:
+        async with self._semaphore:
+            if self._requests is not None:
+                await self._requests.acquire()
+            if self._tokens is not None and tokens:
+                await self._tokens.acquire(tokens)
+            return await call()
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limiting (429), server errors (5xx) and dropped connections are worth retrying."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)) or (
+        type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+    )
+
+
+async def retry_with_backoff(
+    call: Callable[[], Awaitable[T]],
+    max_attempts: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    retryable: Callable[[BaseException], bool] = is_retryable,
+) -> T:
+    """
+    Awaits `call`, retrying retryable errors with exponential backoff and full jitter.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == max_attempts - 1 or not retryable(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+            logging.warning(
+                f"Request failed ({e}), retrying in {delay:.1f}s "
+                f"(attempt {attempt + 1}/{max_attempts})"
+            )
+            await asyncio.sleep(delay)
+    raise AssertionError("unreachable")
@@ -0,0 +1,128 @@
+import logging
+from enum import Enum
+from test_generator import AnalysisResult, OpenAITestGenerator
+from unit_tests import UnitTests
+from fix_applier import FixApplier
+
+MAX_ITERATIONS = 3
+
+
+class RepairOutcome(Enum):
+    PASSED = "tests pass"
+    FUNCTION_FAULT = "the function is at fault, not the tests"
+    FAILED = "tests still fail after repairs"
+
+
+def repair_tests(
+    test_generator: OpenAITestGenerator,
+    unit_test_runner: UnitTests,
+    test_file: str,
+    function_source: str,
+    max_iterations: int = MAX_ITERATIONS,
+    batched: bool = True,
+) -> RepairOutcome:
+    """
+    Runs the tests in `test_file` and feeds failing ones back to the generator until
+    they pass, or `max_iterations` attempts were made. A detected function fault ends
+    the loop early, there is nothing to fix in the tests and they still fail.
+
+    In batched mode all failing tests are diagnosed and fixed with one request and
+    one rewrite of the test file per iteration, instead of one test per iteration.
+
+    Only the whole suite is run up front and once at the end. In between, repaired
+    test methods are hot-swapped onto their classes and just the previously failing
+    tests are re-run.
+    """
+    test_results = unit_test_runner.run_tests(test_file)
+    if test_results.wasSuccessful():
+        return RepairOutcome.PASSED
+
+    for _ in range(max_iterations):
+        test_source_map = unit_test_runner.get_failed_tests_source(test_results)
+        failing_tests = list(test_source_map)
+        repair = _repair_batch if batched else _repair_single
+        function_fault, fixed_tests = repair(test_generator, test_source_map, function_source)
+        if function_fault:
+            return RepairOutcome.FUNCTION_FAULT
+
+        if not fixed_tests:
+            continue
+        if unit_test_runner.hot_swap_tests(fixed_tests):
+            # some methods could not be swapped in place, re-import the whole file
+            test_results = unit_test_runner.run_tests(test_file)
+            if test_results.wasSuccessful():
+                return RepairOutcome.PASSED
+            continue
+
+        test_results = unit_test_runner.run_selected(failing_tests)
+        if test_results.wasSuccessful():
+            logging.info("Repaired tests pass, running the full suite")
+            test_results = unit_test_runner.run_tests(test_file)
+            if test_results.wasSuccessful():
+                return RepairOutcome.PASSED
+
+    logging.error("Max iterations reached.")
+    return RepairOutcome.FAILED
+
+
+def _repair_single(
+    test_generator: OpenAITestGenerator, test_source_map: dict, function_source: str
+) -> tuple[bool, list]:
+    """
+    Diagnoses and fixes the first failing test. Returns whether the function itself
+    is at fault and the tests whose source was rewritten.
+    """
+    # for now just get the first as we are running pymnt on only one function.
+    test_method = list(test_source_map.keys())[0]
+    test_source = test_source_map[test_method]
+    result = test_generator.attempt_to_fix_test(function_source, test_source)
+    logging.info(f"Fixing test: {result.result_type}, result: {result.suggestion}")
+    applier = FixApplier(result.suggestion)
+    if result.result_type == AnalysisResult.FUNC_FAULT:
+        logging.info(f"Function fault detected. Suggested fix: {result.suggestion}")
+        print(
+            "Function fault detected. Suggested fix: ", result.suggestion
+        )  # just print the suggestion i guess ?
+
+        return True, []
+    elif result.result_type == AnalysisResult.TEST_FAULT:
+        logging.info(f"Test fault detected. Suggested fix: {result.suggestion}")
+        applier.apply_test_fix(test_method)
+        return False, [test_method]
+    logging.info("Could not determine fault.Retrying...")
+    return False, []
+
+
+def _repair_batch(
+    test_generator: OpenAITestGenerator, test_source_map: dict, function_source: str
+) -> tuple[bool, list]:
+    """
+    Diagnoses all failing tests in one request and applies every test fix in one go.
+    Returns whether the function itself is at fault and the tests whose source was
+    rewritten. A function fault found by any test wins, no test fixes are applied then.
+    """
+    tests_by_id = {test.id(): test for test in test_source_map}
+    results = test_generator.attempt_to_fix_tests(
+        function_source,
+        {test.id(): source for test, source in test_source_map.items()},
+    )
+
+    test_fixes = {}
+    function_fault = False
+    for test_id, result in results.items():
+        logging.info(f"Fixing test {test_id}: {result.result_type}, result: {result.suggestion}")
+        if result.result_type == AnalysisResult.TEST_FAULT:
+            test_fixes[tests_by_id[test_id]] = result.suggestion
+        elif result.result_type == AnalysisResult.FUNC_FAULT:
+            function_fault = True
+            logging.info(f"Function fault detected by {test_id}. Suggested fix: {result.suggestion}")
+            print(
+                f"Function fault detected by {test_id}. Suggested fix: ", result.suggestion
+            )
+
+    if function_fault:
+        return True, []
+    if test_fixes:
+        return False, FixApplier.apply_test_fixes(test_fixes)
+    logging.info("Could not determine fault.Retrying...")
+    return False, []
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import unittest
+from repair import RepairOutcome, repair_tests
+from test_generator import AnalysisResult, FixAttemptResult
+from unit_tests import UnitTests
+
+FAILING_TESTS = """
+import unittest
+
+
+class TestDouble(unittest.TestCase):
+    def test_double(self):
+        self.assertEqual(2 * 2, 5)
+
+    def test_other(self):
+        self.assertEqual(1, 2)
+"""
+
+
+class FakeGenerator:
+    """Diagnoses every failing test with the given verdicts, in turn."""
+
+    def __init__(self, *verdicts: AnalysisResult) -> None:
+        self.verdicts = list(verdicts)
+        self.requests = 0
+
+    def attempt_to_fix_tests(self, source_of_function, failed_unit_tests):
+        self.requests += 1
+        return {
+            test_id: FixAttemptResult(verdict, "def f(x):\n    return x")
+            for test_id, verdict in zip(sorted(failed_unit_tests), self.verdicts)
+        }
+
+
+class RepairTestsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        sys.path.insert(0, directory.name)
+        self.addCleanup(sys.path.remove, directory.name)
+        self.addCleanup(sys.modules.pop, "repair_target_test", None)
+        with open(os.path.join(directory.name, "repair_target_test.py"), "w") as file:
+            file.write(FAILING_TESTS)
+
+    def repair(self, generator: FakeGenerator) -> RepairOutcome:
+        return repair_tests(generator, UnitTests(quiet=True), "repair_target_test.py", "")
+
+    def test_function_fault_is_not_reported_as_passing(self):
+        generator = FakeGenerator(AnalysisResult.FUNC_FAULT, AnalysisResult.FUNC_FAULT)
+        self.assertEqual(self.repair(generator), RepairOutcome.FUNCTION_FAULT)
+        self.assertEqual(generator.requests, 1)
+
+    def test_function_fault_wins_over_test_fixes(self):
+        generator = FakeGenerator(AnalysisResult.FUNC_FAULT, AnalysisResult.TEST_FAULT)
+        self.assertEqual(self.repair(generator), RepairOutcome.FUNCTION_FAULT)
+
+    def test_unknown_faults_fail_after_max_iterations(self):
+        generator = FakeGenerator(AnalysisResult.UNKNOWN_FAULT, AnalysisResult.UNKNOWN_FAULT)
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(self.repair(generator), RepairOutcome.FAILED)
+        self.assertEqual(generator.requests, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
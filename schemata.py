@@ -0,0 +1,60 @@
+import ast
+import copy
+from typing import Callable, Iterable
+
+# module global holding the ID of the active mutant, 0 runs the original code
+ACTIVE_MUTANT = "__pymnt_mutant__"
+
+# (mutant ID, node the mutant replaces, builds the replacement from that node)
+Mutation = tuple[int, ast.AST, Callable[[ast.AST], ast.AST]]
+
+
+def build_schema(function: ast.AST, mutations: Iterable[Mutation]) -> ast.AST:
+    """
+    Returns a copy of `function` containing all of its mutants at once. Every mutated
+    node becomes a chain of guards on the active mutant ID:
+
+        (a - b) if __pymnt_mutant__ == 3 else (a * b) if __pymnt_mutant__ == 4 else (a + b)
+
+    Statements (augmented assignments) get the same chain as an if/else. The schema is
+    compiled once, after which switching mutants only means changing the global.
+    """
+    by_node: dict[int, list[Mutation]] = {}
+    for mutation in mutations:
+        by_node.setdefault(id(mutation[1]), []).append(mutation)
+    schema = _rebuild(function, by_node)
+    return ast.fix_missing_locations(schema)
+
+
+def _rebuild(node: ast.AST, by_node: dict[int, list[Mutation]]) -> ast.AST:
+    # children first, so a mutant built from the rebuilt node keeps the guards of
+    # mutants nested inside it
+    rebuilt = copy.copy(node)
+    for field, value in ast.iter_fields(node):
+        if isinstance(value, list):
+            setattr(
+                rebuilt,
+                field,
+                [_rebuild(item, by_node) if isinstance(item, ast.AST) else item for item in value],
+            )
+        elif isinstance(value, ast.AST):
+            setattr(rebuilt, field, _rebuild(value, by_node))
+
+    guarded = rebuilt
+    for mutant_id, _, build in reversed(by_node.get(id(node), [])):
+        mutated = ast.copy_location(build(rebuilt), node)
+        guarded = _guard(mutant_id, mutated, guarded, node)
+    return guarded
+
+
+def _guard(mutant_id: int, mutated: ast.AST, otherwise: ast.AST, location: ast.AST) -> ast.AST:
+    test = ast.Compare(
+        left=ast.Name(id=ACTIVE_MUTANT, ctx=ast.Load()),
+        ops=[ast.Eq()],
+        comparators=[ast.Constant(value=mutant_id)],
+    )
+    if isinstance(location, ast.stmt):
+        guard: ast.AST = ast.If(test=test, body=[mutated], orelse=[otherwise])
+    else:
+        guard = ast.IfExp(test=test, body=mutated, orelse=otherwise)
+    return ast.copy_location(guard, location)
@@ -0,0 +1,179 @@
+import logging
+import re
+from typing import NoReturn, Optional
+
+# of the methods in the class body of a generated test file
+METHOD_INDENT = "    "
+
+_METHOD_START = re.compile(r"(async\s+)?def\s")
+_TEST_METHOD = re.compile(r"(async\s+)?def\s+test\w*\s*\(\s*self\b")
+_CLASS = re.compile(r"class\s+\w")
+_IMPORT = re.compile(r"(import\s+\w|from\s+[\w.]+\s+import\s)")
+
+
+class MalformedOutputError(ValueError):
+    """The completion is not a sequence of test methods, it is not worth reading on."""
+
+
+class TestMethodParser:
+    """
+    Splits a completion into test methods while it is still streaming in. A method
+    is complete once the next one starts (or the stream ends), and is re-indented
+    to METHOD_INDENT and compiled in a class body right away. Anything the prompt
+    asks the model not to write, like markdown fences, class definitions, imports
+    or prose between the methods, raises MalformedOutputError as soon as its line
+    is in, so the request can be dropped.
+
+        parser = TestMethodParser()
+        for chunk in stream:
+            for method in parser.feed(chunk):
+                ...
+        parser.finish()
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        # the methods completed so far, re-indented
+        self.methods: list[str] = []
+        self._buffer = ""
+        # decorators (and comments above them) waiting for the def they belong to
+        self._prefix: list[str] = []
+        # comments and blank lines after them, waiting for the next line to tell
+        # whether they are in the current method or above the next one
+        self._comments: list[str] = []
+        self._current: list[str] = []
+        # of the def line and of the first body line of the current method
+        self._indent: Optional[int] = None
+        self._body_indent: Optional[int] = None
+
+    def feed(self, chunk: str) -> list[str]:
+        """Consumes the next chunk and returns the methods it completed."""
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        completed = []
+        for line in lines:
+            completed.extend(self._line(line))
+        return completed
+
+    def finish(self) -> list[str]:
+        """
+        Ends the stream and returns the last method. A last method that does not
+        compile was most likely cut off at the token limit, it is dropped as long
+        as earlier methods came through.
+        """
+        completed = self._line(self._buffer) if self._buffer else []
+        self._buffer = ""
+        self._comments = []
+        if self._current:
+            try:
+                completed.extend(self._complete())
+            except MalformedOutputError as e:
+                if not self.methods:
+                    raise
+                logging.warning(f"Dropping the last generated test method: {e}")
+        if not self.methods:
+            raise MalformedOutputError("the response holds no test methods")
+        return completed
+
+    def _line(self, line: str) -> list[str]:
+        stripped = line.strip()
+        if self._current and self._in_string():
+            self._current.append(line)
+            return []
+        if not stripped or stripped.startswith("#"):
+            # comments can sit at any indentation, even column 0 inside a method body
+            if self._comments or stripped:
+                self._comments.append(line)
+            elif self._current:
+                self._current.append(line)
+            return []
+        if stripped.startswith("```"):
+            self._abort("markdown code fence")
+
+        indent = len(line.expandtabs()) - len(line.expandtabs().lstrip())
+        if self._current and self._in_body(indent) and not self._next_test(stripped, indent):
+            if self._body_indent is None:
+                self._body_indent = indent
+            self._current.extend(self._comments)
+            self._comments = []
+            self._current.append(line)
+            return []
+
+        # a line at (or left of) method level: a new method, or something not allowed there
+        if _CLASS.match(stripped):
+            self._abort(f"class definition: {stripped}")
+        if _IMPORT.match(stripped):
+            self._abort(f"import: {stripped}")
+        if stripped.startswith("@"):
+            completed = self._complete() if self._current else []
+            self._prefix.extend(self._comments + [line])
+            self._comments = []
+            return completed
+        if _METHOD_START.match(stripped):
+            completed = self._complete() if self._current else []
+            self._current = self._prefix + self._comments + [line]
+            self._prefix = []
+            self._comments = []
+            self._indent = indent
+            self._body_indent = None
+            return completed
+        self._abort(f"unexpected line outside a test method: {stripped}")
+
+    def _abort(self, reason: str) -> NoReturn:
+        # the method before the offending line is complete, keep it if it compiles
+        if self._current:
+            try:
+                self._complete()
+            except MalformedOutputError:
+                pass
+        raise MalformedOutputError(reason)
+
+    def _in_body(self, indent: int) -> bool:
+        if self._indent is None or indent <= self._indent:
+            return False
+        # left of the body is method level too, models often leave the first
+        # def line unindented and indent the following ones
+        return self._body_indent is None or indent >= self._body_indent
+
+    def _next_test(self, stripped: str, indent: int) -> bool:
+        # a test method never defines another one, at the indentation of the body
+        # it is the next method of a response whose first def line is unindented
+        return indent == self._body_indent and _TEST_METHOD.match(stripped) is not None
+
+    def _in_string(self) -> bool:
+        # an odd number of triple quotes leaves a multi-line string open, its lines
+        # can look like anything
+        source = "\n".join(self._current)
+        return source.count('"""') % 2 == 1 or source.count("'''") % 2 == 1
+
+    def _complete(self) -> list[str]:
+        lines = self._current
+        self._current = []
+        definition = next((line for line in lines if _METHOD_START.match(line.strip())), None)
+        if definition is None:
+            raise MalformedOutputError("method body without a def line")
+        whitespace = definition[: len(definition) - len(definition.lstrip())]
+        # lines not starting with the def line's indentation are left alone, they can
+        # only be the inside of multi-line strings (or mistakes compile reports)
+        method = "\n".join(
+            METHOD_INDENT + line[len(whitespace) :]
+            if line.strip() and line.startswith(whitespace)
+            else line
+            for line in lines
+        ).rstrip()
+        try:
+            compile(f"class _Generated:\n{method}\n", "<generated test>", "exec")
+        except SyntaxError as e:
+            raise MalformedOutputError(f"syntax error: {e.msg} in\n{method}") from e
+        self.methods.append(method)
+        return [method]
+
+
+def join_methods(methods: list[str]) -> str:
+    """
+    The methods as the body of a TestCase class. The first line is not indented,
+    it goes right after the indentation of the class header line.
+    """
+    return "\n\n".join(methods).lstrip()
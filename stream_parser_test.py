@@ -0,0 +1,94 @@
+import unittest
+from stream_parser import MalformedOutputError, TestMethodParser, join_methods
+
+
+def parse(text: str, chunk_size: int = 7) -> TestMethodParser:
+    parser = TestMethodParser()
+    for start in range(0, len(text), chunk_size):
+        parser.feed(text[start : start + chunk_size])
+    parser.finish()
+    return parser
+
+
+class TestMethodParserTest(unittest.TestCase):
+    def test_splits_methods_as_they_complete(self):
+        parser = TestMethodParser()
+        self.assertEqual(parser.feed("def test_a(self):\n    pass\n"), [])
+        completed = parser.feed("def test_b(self):\n    pass\n")
+        self.assertEqual(completed, ["    def test_a(self):\n        pass"])
+        self.assertEqual(parser.finish(), ["    def test_b(self):\n        pass"])
+
+    def test_first_def_unindented_and_the_rest_indented(self):
+        text = "def test_a(self):\n        pass\n\n    def test_b(self):\n        pass\n"
+        self.assertEqual(len(parse(text).methods), 2)
+
+    def test_tabs(self):
+        text = "def test_a(self):\n\t\tpass\n\n\tdef test_b(self):\n\t\tpass\n"
+        self.assertEqual(len(parse(text).methods), 2)
+
+    def test_column_zero_comment_inside_a_body(self):
+        text = (
+            "def test_a(self):\n"
+            "    x = 1\n"
+            "# a comment at column 0\n"
+            "    self.assertEqual(x, 1)\n"
+            "\n"
+            "# above the next method\n"
+            "def test_b(self):\n"
+            "    pass\n"
+        )
+        methods = parse(text).methods
+        self.assertEqual(len(methods), 2)
+        self.assertIn("self.assertEqual(x, 1)", methods[0])
+        self.assertIn("# above the next method", methods[1])
+
+    def test_comments_and_decorators_go_with_the_next_method(self):
+        text = "# first\n@unittest.skip('later')\ndef test_a(self):\n    pass\n"
+        self.assertEqual(
+            parse(text).methods,
+            ["    # first\n    @unittest.skip('later')\n    def test_a(self):\n        pass"],
+        )
+
+    def test_string_content_is_not_parsed(self):
+        text = "def test_a(self):\n    s = '''\nclass Foo:\n```\n'''\n    self.assertTrue(s)\n"
+        self.assertEqual(len(parse(text).methods), 1)
+
+    def test_forbidden_lines_abort(self):
+        for text in [
+            "```python\ndef test_a(self):\n    pass\n",
+            "import unittest\n",
+            "class TestA(unittest.TestCase):\n",
+            "Here are your tests:\n",
+        ]:
+            with self.subTest(text=text), self.assertRaises(MalformedOutputError):
+                parse(text)
+
+    def test_abort_keeps_the_method_before_the_offending_line(self):
+        parser = TestMethodParser()
+        with self.assertRaises(MalformedOutputError):
+            parser.feed("def test_a(self):\n    pass\nThat is all!\n")
+        self.assertEqual(parser.methods, ["    def test_a(self):\n        pass"])
+
+    def test_syntax_error_aborts(self):
+        with self.assertRaises(MalformedOutputError):
+            parse("def test_a(self):\n    x = (\n\ndef test_b(self):\n    pass\n")
+
+    def test_truncated_last_method_is_dropped(self):
+        with self.assertLogs(level="WARNING"):
+            parser = parse("def test_a(self):\n    pass\n\ndef test_b(self):\n    f(1,")
+        self.assertEqual(parser.methods, ["    def test_a(self):\n        pass"])
+
+    def test_no_methods(self):
+        with self.assertRaises(MalformedOutputError):
+            parse("")
+
+    def test_join_methods(self):
+        methods = ["    def test_a(self):\n        pass", "    def test_b(self):\n        pass"]
+        self.assertEqual(
+            join_methods(methods),
+            "def test_a(self):\n        pass\n\n    def test_b(self):\n        pass",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,15 @@
-import os
+import asyncio
+import json
 import logging
-import inspect
-from typing import Callable, Any
+import re
+import textwrap
+from typing import Any, Callable, Optional
 from abc import ABC, abstractmethod
-from openai import OpenAI
+from rate_limit import RateLimiter, retry_with_backoff
+from llm_cache import ResponseCache, cache_key
+from llm_backend import LLMBackend, OpenAIBackend
+from discovery import FunctionLike, FunctionSource, describe_function
+from stream_parser import MalformedOutputError, TestMethodParser, join_methods
 from enum import Enum
 from dataclasses import dataclass
 
@@ -14,14 +20,25 @@ class AnalysisResult(Enum):
     UNKNOWN_FAULT = 2  # cannot determine the issue
 
 
+# malformed generations are retried right away this often, after that the valid
+# methods of the best attempt are used
+MAX_GENERATION_ATTEMPTS = 3
+
+
 @dataclass
 class FixAttemptResult:
     result_type: AnalysisResult
     suggestion: str
 
 
+def test_class_name(function: FunctionLike) -> str:
+    """Name of the TestCase class the generated tests of `function` are written to."""
+    qualname = describe_function(function).qualname
+    return f"Test{qualname.replace('.', '_').capitalize()}"
+
+
 class TestGenerator(ABC):
-    functions: list[Callable[..., Any]]
+    functions: list[FunctionLike]
 
     @abstractmethod
     def __init__(self) -> None:
@@ -34,8 +51,8 @@ class TestGenerator(ABC):
 
 class OpenAITestGenerator(TestGenerator):
     """
-    Generates unit tests for multiple Python functions using OpenAI's GPT API.
-    Requires an OpenAI API key located in the environment variable OPENAI_API_KEY.
+    Generates unit tests for multiple Python functions using a chat completion backend,
+    by default OpenAI's GPT API with the API key in the environment variable OPENAI_API_KEY.
     """
 
     _base_prompt = """
@@ -48,44 +65,242 @@ class OpenAITestGenerator(TestGenerator):
             The function is not a method of the class. Call it and use it as it is.
             keep indentation the same among the methods.
             """
-    _api_key = os.getenv("OPENAI_API_KEY")
-    if not _api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is not set")
-    client = OpenAI(api_key=_api_key)
-
-    def __init__(self, functions: list[Callable[..., Any]]) -> None:
+    _generation_system_prompt = (
+        "You are a helpful assistant that generates Python unit tests."
+    )
+    _generation_max_tokens = 1500
+    # every failing test gets 500 tokens for its verdict and fix, larger batches are
+    # split over several requests so the response stays within the model's limits
+    _fix_batch_size = 8
+
+    def __init__(
+        self,
+        functions: list[FunctionLike],
+        cache: Optional[ResponseCache] = None,
+        backend: Optional[LLMBackend] = None,
+    ) -> None:
         self.functions = functions
+        self.cache = cache
+        self.backend = backend if backend is not None else OpenAIBackend()
+
+    def _complete(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: int,
+        temperature: float,
+        refresh: bool = False,
+        usable: Optional[Callable[[str], bool]] = None,
+    ) -> Optional[str]:
+        """
+        Single chat completion, served from the response cache when possible.
+        `refresh` skips the cache lookup (the response is still stored), for retries
+        that need a different answer than last time. Responses `usable` rejects are
+        not stored, so a later request with the same prompt asks the model again.
+        """
+        key = cache_key(
+            self.backend.cache_namespace, system_prompt, user_prompt, temperature, max_tokens
+        )
+        if self.cache is not None and not refresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        content = self.backend.complete(system_prompt, user_prompt, max_tokens, temperature)
+        if content is not None and self.cache is not None and (usable is None or usable(content)):
+            self.cache.put(key, content)
+        return content
+
+    def _stream_tests(self, function: FunctionSource) -> str:
+        """
+        Streams the generated tests of `function`, compiling every method as soon as
+        it is complete. Malformed output cancels the request and retries it straight
+        away. Returns the methods as a class body.
+        """
+        prompt = self._generation_prompt(function)
+        key, cached = self._cached_generation(prompt)
+        if cached is not None:
+            return cached
+
+        parser = TestMethodParser()
+        best: list[str] = []
+        for attempt in range(MAX_GENERATION_ATTEMPTS):
+            parser.reset()
+            chunks = self.backend.stream(
+                self._generation_system_prompt, prompt, self._generation_max_tokens, 0.7
+            )
+            try:
+                for chunk in chunks:
+                    parser.feed(chunk)
+                parser.finish()
+            except MalformedOutputError as e:
+                best = self._discard_attempt(function, attempt, e, parser.methods, best)
+                continue
+            finally:
+                chunks.close()
+            return self._accept_generation(key, parser.methods)
+        return self._best_attempt(function, best)
+
+    async def _stream_tests_async(self, function: FunctionSource, limiter: RateLimiter) -> str:
+        """_stream_tests under the rate limits, retrying 429 and 5xx responses."""
+        prompt = self._generation_prompt(function)
+        key, cached = self._cached_generation(prompt)
+        if cached is not None:
+            return cached
+
+        # rough estimate of 4 characters per token, plus the completion budget
+        tokens = (
+            len(self._generation_system_prompt) + len(prompt)
+        ) / 4 + self._generation_max_tokens
+        parser = TestMethodParser()
+
+        async def consume() -> None:
+            # a retried request starts over
+            parser.reset()
+            chunks = self.backend.stream_async(
+                self._generation_system_prompt, prompt, self._generation_max_tokens, 0.7
+            )
+            try:
+                async for chunk in chunks:
+                    parser.feed(chunk)
+                parser.finish()
+            finally:
+                await chunks.aclose()
+
+        best: list[str] = []
+        for attempt in range(MAX_GENERATION_ATTEMPTS):
+            try:
+                await retry_with_backoff(lambda: limiter.run(consume, tokens))
+            except MalformedOutputError as e:
+                best = self._discard_attempt(function, attempt, e, parser.methods, best)
+                continue
+            return self._accept_generation(key, parser.methods)
+        return self._best_attempt(function, best)
+
+    def _cached_generation(self, prompt: str) -> tuple[str, Optional[str]]:
+        key = cache_key(
+            self.backend.cache_namespace,
+            self._generation_system_prompt,
+            prompt,
+            0.7,
+            self._generation_max_tokens,
+        )
+        return key, self.cache.get(key) if self.cache is not None else None
+
+    def _accept_generation(self, key: str, methods: list[str]) -> str:
+        content = join_methods(methods)
+        if self.cache is not None:
+            self.cache.put(key, content)
+        return content
+
+    @staticmethod
+    def _discard_attempt(
+        function: FunctionSource,
+        attempt: int,
+        error: MalformedOutputError,
+        methods: list[str],
+        best: list[str],
+    ) -> list[str]:
+        logging.warning(
+            f"Cancelled generation {attempt + 1}/{MAX_GENERATION_ATTEMPTS} for "
+            f"{function.qualname} after {len(methods)} valid test methods: {error}"
+        )
+        return list(methods) if len(methods) > len(best) else best
+
+    @staticmethod
+    def _best_attempt(function: FunctionSource, best: list[str]) -> str:
+        # not cached, the next run should get another chance at a clean response
+        if not best:
+            raise ValueError(f"response for {function.qualname} was invalid")
+        logging.warning(
+            f"Using the {len(best)} valid test methods of the best attempt "
+            f"for {function.qualname}"
+        )
+        return join_methods(best)
 
     def generate_tests(self, output_file: str) -> None:
         all_test_cases = []
-        for function in self.functions:
-            logging.info(f"Generating tests for function: {function.__name__}")
-            logging.debug(f"Source code of function: {inspect.getsource(function)}")
+        for function in map(describe_function, self.functions):
+            logging.info(f"Generating tests for function: {function.qualname}")
+            logging.debug(f"Source code of function: {function.source}")
+            all_test_cases.append((function, self._stream_tests(function)))
+
+        self._write_test_file(output_file, all_test_cases)
+
+    def generate_tests_concurrently(self, output_file: str, **limits: Any) -> None:
+        """Synchronous entry point for generate_tests_async."""
+        asyncio.run(self.generate_tests_async(output_file, **limits))
+
+    async def generate_tests_async(
+        self,
+        output_file: str,
+        max_concurrency: int = 8,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        functions: Optional[list[FunctionLike]] = None,
+        limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        """
+        Same as generate_tests, but the requests for all functions are in flight at
+        once, bounded by `max_concurrency` and the requests/tokens per minute limits.
+        Rate limited (429) and failed (5xx) requests are retried with jittered
+        backoff. The test file is written once every response is in.
 
-            prompt = f"""
+        `functions` overrides self.functions, and passing a `limiter` shares its
+        limits with other generations running at the same time.
+        """
+        if limiter is None:
+            limiter = RateLimiter(max_concurrency, requests_per_minute, tokens_per_minute)
+        if functions is None:
+            functions = self.functions
+
+        async def generate(function: FunctionLike) -> tuple[FunctionLike, str]:
+            function = describe_function(function)
+            logging.info(f"Generating tests for function: {function.qualname}")
+            return function, await self._stream_tests_async(function, limiter)
+
+        all_test_cases = await asyncio.gather(
+            *(generate(function) for function in functions)
+        )
+        self._write_test_file(output_file, list(all_test_cases))
+
+    def _generation_prompt(self, function: FunctionLike) -> str:
+        function = describe_function(function)
+        return f"""
             {self._base_prompt}
-            {function.__name__}
-            {inspect.getsource(function)}
+            {function.qualname}
+            {function.source}
             """
 
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that generates Python unit tests.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                max_tokens=1500,
-                temperature=0.7,
-            )
-            content = response.choices[0].message.content
-            if content is None:
-                raise ValueError("response was invalid")
-            test_cases = content.strip()
-            all_test_cases.append((function, test_cases))
+    def generate_killing_tests(
+        self, function: FunctionLike, surviving_mutants: str, existing_tests: list[str]
+    ) -> Optional[str]:
+        """
+        Asks for new test methods that tell `function` apart from the mutants that
+        survived the existing tests. `surviving_mutants` is a per-line digest of them.
+        Returns the source of the new methods, or None if the response was unusable.
+        """
+        function = describe_function(function)
+        logging.info(f"Generating tests against surviving mutants of {function.qualname}")
+        prompt = f"""
+            {self._base_prompt}
+            The existing tests ({", ".join(existing_tests) or "none"}) pass on the function
+            below but cannot tell it apart from these mutated versions of it:
+            {surviving_mutants}
+            Write only new test methods, with new names, that pass on the original function
+            and fail on as many of the mutated versions as possible.
+            {function.qualname}
+            {function.source}
+            """
+        content = self._complete(
+            self._generation_system_prompt, prompt, self._generation_max_tokens, 0.7
+        )
+        if content is None:
+            return None
+        content = re.sub(r"^```[a-z]*\s*|\s*```$", "", content.strip())
+        return content if self._compiles(content) else None
 
+    def _write_test_file(self, output_file: str, all_test_cases: list[tuple]) -> None:
         test_file_content = self._generate_test_file_content(all_test_cases)
 
         with open(output_file, "w") as f:
@@ -123,23 +338,20 @@ class OpenAITestGenerator(TestGenerator):
             'FUNC_FAULT' - if the function appears incorrect
             'UNKNOWN_FAULT' - if you cannot determine which is wrong
             """
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a Python testing expert. Analyze code and respond precisely.",
-                    },
-                    {"role": "user", "content": analysis_prompt},
-                ],
+            content = self._complete(
+                "You are a Python testing expert. Analyze code and respond precisely.",
+                analysis_prompt,
                 max_tokens=20,
                 temperature=0.1,
+                refresh=attempt > 0,
+                # a later repair iteration should get another chance at a verdict
+                usable=lambda content: content.strip().upper() != "UNKNOWN_FAULT",
             )
 
-            if response.choices[0].message.content is None:
+            if content is None:
                 raise ValueError("Invalid response from OpenAI API")
 
-            fault_type = response.choices[0].message.content.strip().upper()
+            fault_type = content.strip().upper()
 
             if fault_type == "UNKNOWN_FAULT":
                 return FixAttemptResult(
@@ -159,23 +371,18 @@ class OpenAITestGenerator(TestGenerator):
                 {failed_unit_test}
                 """
 
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are a Python expert. Generate only the corrected function code.",
-                        },
-                        {"role": "user", "content": fix_prompt},
-                    ],
+                content = self._complete(
+                    "You are a Python expert. Generate only the corrected function code.",
+                    fix_prompt,
                     max_tokens=1000,
                     temperature=0.7,
+                    refresh=attempt > 0,
                 )
 
-                if response.choices[0].message.content is None:
+                if content is None:
                     continue
 
-                suggested_fix = response.choices[0].message.content.strip()
+                suggested_fix = content.strip()
                 return FixAttemptResult(AnalysisResult.FUNC_FAULT, suggested_fix)
 
             # If we reach here, attempt to fix the test
@@ -191,26 +398,20 @@ class OpenAITestGenerator(TestGenerator):
             {failed_unit_test}
             """
 
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a Python testing expert. Generate only the corrected test code.",
-                    },
-                    {"role": "user", "content": fix_prompt},
-                ],
+            content = self._complete(
+                "You are a Python testing expert. Generate only the corrected test code.",
+                fix_prompt,
                 max_tokens=1000,
                 temperature=0.7,
+                refresh=attempt > 0,
+                usable=self._is_test_fix,
             )
 
-            if response.choices[0].message.content is None:
+            if content is None:
                 continue
 
-            fixed_test = response.choices[0].message.content.strip()
-
-            # Verify the fixed test looks valid
-            if "def test_" in fixed_test and "self" in fixed_test:
+            fixed_test = content.strip()
+            if self._is_test_fix(fixed_test):
                 return FixAttemptResult(AnalysisResult.TEST_FAULT, fixed_test)
 
         return FixAttemptResult(
@@ -218,19 +419,145 @@ class OpenAITestGenerator(TestGenerator):
             "Unable to generate a valid fix after multiple attempts",
         )
 
+    def attempt_to_fix_tests(
+        self, source_of_function: str, failed_unit_tests: dict[str, str]
+    ) -> dict[str, FixAttemptResult]:
+        """
+        Batched version of attempt_to_fix_test: classifies and fixes the failing tests
+        of a function with one request per `_fix_batch_size` tests.
+        Args:
+            failed_unit_tests: test id -> source of the failing test method
+        Returns:
+            test id -> FixAttemptResult. Tests the model gave no usable verdict for
+            come back as UNKNOWN_FAULT.
+        """
+        test_ids = list(failed_unit_tests)
+        results: dict[str, FixAttemptResult] = {}
+        for start in range(0, len(test_ids), self._fix_batch_size):
+            chunk = test_ids[start : start + self._fix_batch_size]
+            results.update(
+                self._fix_test_batch(
+                    source_of_function, {test_id: failed_unit_tests[test_id] for test_id in chunk}
+                )
+            )
+        return results
+
+    def _fix_test_batch(
+        self, source_of_function: str, failed_unit_tests: dict[str, str]
+    ) -> dict[str, FixAttemptResult]:
+        max_attempts = 3
+        tests = "\n".join(
+            f"### {test_id}\n{source}" for test_id, source in failed_unit_tests.items()
+        )
+        prompt = f"""
+            Analyze this function and its failing unit tests. For every test decide whether
+            the test or the function has the problem, considering only syntax, logic and
+            correctness - not style or best practices.
+
+            Function:
+            {source_of_function}
+
+            Failing Tests (each preceded by its id):
+            {tests}
+
+            Respond with a single JSON object and nothing else, in this form:
+            {{"results": [{{"test": "<id>", "verdict": "TEST_FAULT" | "FUNC_FAULT" | "UNKNOWN_FAULT", "fix": "<code>"}}]}}
+            For TEST_FAULT, "fix" is the complete corrected test method, including its def line.
+            For FUNC_FAULT, "fix" is the complete corrected function.
+            For UNKNOWN_FAULT, "fix" is an empty string.
+            """
+
+        parsed: dict[str, dict[str, FixAttemptResult]] = {}
+
+        def parse(content: str) -> dict[str, FixAttemptResult]:
+            if content not in parsed:
+                parsed[content] = self._parse_fix_results(content, failed_unit_tests)
+            return parsed[content]
+
+        def usable(content: str) -> bool:
+            # answers without a single verdict are not cached, or every later repair
+            # iteration would get them again
+            return any(
+                result.result_type != AnalysisResult.UNKNOWN_FAULT
+                for result in parse(content).values()
+            )
+
+        results: dict[str, FixAttemptResult] = {}
+        for attempt in range(max_attempts):
+            content = self._complete(
+                "You are a Python testing expert. Analyze code and respond only with JSON.",
+                prompt,
+                max_tokens=1000 + 500 * len(failed_unit_tests),
+                temperature=0.1,
+                refresh=attempt > 0,
+                usable=usable,
+            )
+            if content is None:
+                continue
+            results = parse(content)
+            if results:
+                break
+
+        unknown = FixAttemptResult(
+            AnalysisResult.UNKNOWN_FAULT,
+            "Unable to determine whether the function or test is at fault.",
+        )
+        return {test_id: results.get(test_id, unknown) for test_id in failed_unit_tests}
+
+    def _parse_fix_results(
+        self, content: str, failed_unit_tests: dict[str, str]
+    ) -> dict[str, FixAttemptResult]:
+        # models like to wrap JSON in markdown fences despite being told not to
+        content = re.sub(r"^```[a-z]*\s*|\s*```$", "", content.strip())
+        try:
+            entries = json.loads(content)["results"]
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Could not parse batched fix response: {e}")
+            return {}
+
+        results = {}
+        for entry in entries:
+            if not isinstance(entry, dict) or entry.get("test") not in failed_unit_tests:
+                continue
+            fix = str(entry.get("fix") or "").strip()
+            try:
+                verdict = AnalysisResult[str(entry.get("verdict", "")).strip().upper()]
+            except KeyError:
+                continue
+            if verdict != AnalysisResult.UNKNOWN_FAULT and not self._compiles(fix):
+                logging.warning(f"Discarding fix for {entry['test']}: it does not compile")
+                continue
+            results[entry["test"]] = FixAttemptResult(verdict, fix)
+        return results
+
+    def _is_test_fix(self, source: str) -> bool:
+        source = source.strip()
+        return "def test_" in source and "self" in source and self._compiles(source)
+
+    def _compiles(self, source: str) -> bool:
+        try:
+            compile(textwrap.dedent(source), "<fix>", "exec")
+        except SyntaxError:
+            return False
+        return "def " in source
+
     def _generate_test_file_content(self, all_test_cases: list[tuple]) -> str:
         content = "import unittest\n"
 
-        modules = set(func.__module__ for func, _ in all_test_cases)
+        all_test_cases = [
+            (describe_function(func), test_cases) for func, test_cases in all_test_cases
+        ]
+        modules = dict.fromkeys(func.module for func, _ in all_test_cases)
         for module in modules:
-            content += f"from .{module} import {', '.join(func.__name__ for func, _ in all_test_cases if func.__module__ == module)}\n"
+            names = dict.fromkeys(
+                func.import_name for func, _ in all_test_cases if func.module == module
+            )
+            content += f"from .{module} import {', '.join(names)}\n"
 
         content += "\n\n"
 
         for function, test_cases in all_test_cases:
-            content += (
-                f"class Test{function.__name__.capitalize()}(unittest.TestCase):\n    "
-            )
+            content += f"class {test_class_name(function)}(unittest.TestCase):\n    "
             content += test_cases
             content += "\n"
 
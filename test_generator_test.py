@@ -0,0 +1,46 @@
+import json
+import re
+import unittest
+from typing import Optional
+from llm_backend import LLMBackend
+from test_generator import AnalysisResult, OpenAITestGenerator
+
+
+class VerdictBackend(LLMBackend):
+    """Answers every batched fix request with a TEST_FAULT for each test in the prompt."""
+
+    model = "verdicts"
+
+    def __init__(self) -> None:
+        self.max_tokens: list[int] = []
+
+    def complete(
+        self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float
+    ) -> Optional[str]:
+        self.max_tokens.append(max_tokens)
+        results = [
+            {"test": test_id, "verdict": "TEST_FAULT", "fix": f"def {test_id}(self):\n    pass"}
+            for test_id in re.findall(r"### (\S+)", user_prompt)
+        ]
+        return json.dumps({"results": results})
+
+    async def complete_async(self, system_prompt, user_prompt, max_tokens, temperature):
+        return self.complete(system_prompt, user_prompt, max_tokens, temperature)
+
+
+class AttemptToFixTestsTest(unittest.TestCase):
+    def test_large_batches_are_split_into_bounded_requests(self):
+        backend = VerdictBackend()
+        generator = OpenAITestGenerator(functions=[], backend=backend)
+        failing = {f"test_{index}": f"def test_{index}(self):\n    fail()" for index in range(20)}
+        results = generator.attempt_to_fix_tests("def f():\n    pass", failing)
+        self.assertEqual(len(backend.max_tokens), 3)
+        self.assertLessEqual(max(backend.max_tokens), 1000 + 500 * generator._fix_batch_size)
+        self.assertEqual(set(results), set(failing))
+        self.assertTrue(
+            all(result.result_type == AnalysisResult.TEST_FAULT for result in results.values())
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
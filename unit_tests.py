@@ -1,27 +1,362 @@
+import ast
 import importlib
+import importlib.util
 import unittest
+import linecache
 import logging
 import inspect
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Iterable, Optional
+from fix_applier import find_test_method
+
+try:
+    import fcntl
+except ImportError:  # Windows, saves are not serialized there
+    fcntl = None
+
+# with fewer tests per worker, or suites expected to finish faster than this many
+# seconds, forking the workers costs more than it saves
+MIN_TESTS_PER_SHARD = 8
+MIN_SHARDED_DURATION = 0.5
+
+
+class TimedTestResult(unittest.TestResult):
+    """TestResult that also records how long every test took, keyed by test id."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.durations: dict[str, float] = {}
+        self._started_at: dict[str, float] = {}
+
+    def startTest(self, test: unittest.TestCase) -> None:
+        self._started_at[test.id()] = time.perf_counter()
+        super().startTest(test)
+
+    def stopTest(self, test: unittest.TestCase) -> None:
+        super().stopTest(test)
+        started_at = self._started_at.pop(test.id(), None)
+        if started_at is not None:
+            self.durations[test.id()] = time.perf_counter() - started_at
+
+    @property
+    def total_duration(self) -> float:
+        return sum(self.durations.values())
+
+
+class TimedTextTestResult(TimedTestResult, unittest.TextTestResult):
+    pass
+
+
+@dataclass
+class TestRecord:
+    """What is known about a single test across runs."""
+
+    runs: int = 0
+    total_duration: float = 0.0
+    # operator -> number of mutants of that kind the test ran against / killed
+    mutant_runs: dict[str, int] = field(default_factory=dict)
+    kills: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def mean_duration(self) -> Optional[float]:
+        return self.total_duration / self.runs if self.runs else None
+
+    def kill_probability(self, operator: str) -> float:
+        # Laplace smoothing so tests without history are neither favoured nor ruled out
+        return (self.kills.get(operator, 0) + 1) / (self.mutant_runs.get(operator, 0) + 2)
+
+
+class TestStatistics:
+    """
+    Per-test runtime and mutant kill history, persisted as JSON so it survives
+    across invocations.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._path = path
+        self._records: dict[str, TestRecord] = {}
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, "r") as file:
+                    data = json.load(file)
+                self._records = {
+                    test_id: TestRecord(**record) for test_id, record in data.items()
+                }
+            except (OSError, ValueError, TypeError) as e:
+                logging.warning(f"Ignoring unreadable test statistics in {path}: {e}")
+
+    def record_durations(self, durations: dict[str, float]) -> None:
+        for test_id, duration in durations.items():
+            record = self._records.setdefault(test_id, TestRecord())
+            record.runs += 1
+            record.total_duration += duration
+
+    def record_mutant(
+        self, operator: str, tests: Iterable[str], killed_by: Optional[str]
+    ) -> None:
+        """
+        Record the tests that ran against one mutant, and which of them killed it.
+        Their durations are not recorded: runs cut short by a kill or stretched to
+        the timeout say nothing about what a test costs on the original code.
+        """
+        for test_id in tests:
+            record = self._records.setdefault(test_id, TestRecord())
+            record.mutant_runs[operator] = record.mutant_runs.get(operator, 0) + 1
+        if killed_by is not None and killed_by in self._records:
+            record = self._records[killed_by]
+            record.kills[operator] = record.kills.get(operator, 0) + 1
+
+    def order(
+        self, tests: Iterable[unittest.TestCase], operator: str
+    ) -> list[unittest.TestCase]:
+        """
+        Sort tests so the ones most likely to kill a mutant of the given operator
+        per second of runtime come first. The original order breaks ties.
+        """
+        duration = self._duration_estimator()
+
+        def cost(test: unittest.TestCase) -> float:
+            record = self._records.get(test.id(), TestRecord())
+            return -record.kill_probability(operator) / max(duration(test), 1e-6)
+
+        return sorted(tests, key=cost)
+
+    def expected_duration(self, tests: Iterable[unittest.TestCase]) -> float:
+        duration = self._duration_estimator()
+        return sum(map(duration, tests))
+
+    def balance(
+        self, tests: Iterable[unittest.TestCase], shards: int
+    ) -> list[list[unittest.TestCase]]:
+        """
+        Split tests into at most `shards` groups of about the same total runtime.
+        Tests of a TestCase class are never split, so its class fixtures run (and
+        fail) once: slowest class first, every class joins the group with the least
+        runtime so far (longest processing time first). Each group keeps the
+        original order of its tests.
+        """
+        duration = self._duration_estimator()
+        tests = list(tests)
+        classes: dict[type, list[int]] = {}
+        for index, test in enumerate(tests):
+            classes.setdefault(type(test), []).append(index)
+        costs = {
+            cls: sum(duration(tests[index]) for index in indices)
+            for cls, indices in classes.items()
+        }
+        groups: list[list[int]] = [[] for _ in range(max(1, min(shards, len(classes))))]
+        loads = [0.0] * len(groups)
+        for cls in sorted(classes, key=lambda cls: -costs[cls]):
+            lightest = loads.index(min(loads))
+            groups[lightest].extend(classes[cls])
+            loads[lightest] += costs[cls]
+        return [[tests[index] for index in sorted(group)] for group in groups if group]
+
+    def _duration_estimator(self):
+        # tests without history count as the mean of the known ones
+        known = [record.mean_duration for record in self._records.values() if record.runs]
+        default_duration = sum(known) / len(known) if known else 1.0
+
+        def duration(test: unittest.TestCase) -> float:
+            record = self._records.get(test.id())
+            if record is None or record.mean_duration is None:
+                return default_duration
+            return record.mean_duration
+
+        return duration
+
+    def save(self) -> None:
+        """
+        Batch workers save the same file concurrently. Every save goes through its
+        own temporary file, and tests another process saved since this one loaded
+        the file are kept. A lock file serializes the merges, so none is lost.
+        """
+        if self._path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self._path))
+        os.makedirs(directory, exist_ok=True)
+        with open(f"{self._path}.lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            records = {**self._load_saved(self._path), **self._records}
+            descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(descriptor, "w") as file:
+                    json.dump(
+                        {test_id: asdict(record) for test_id, record in records.items()}, file
+                    )
+                os.replace(temp_path, self._path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+    @staticmethod
+    def _load_saved(path: str) -> dict[str, TestRecord]:
+        try:
+            with open(path, "r") as file:
+                data = json.load(file)
+            return {test_id: TestRecord(**record) for test_id, record in data.items()}
+        except (OSError, ValueError, TypeError):
+            return {}
 
 
 class UnitTests:
-    """Defines a class to run unit tests programmatically."""
+    """
+    Defines a class to run unit tests programmatically.
+    With `jobs` > 1, large suites are sharded over that many forked workers.
+    `quiet` drops the per-test console output.
+    """
 
-    def run_tests(self, test_file: str) -> unittest.TestResult:
-        logging.info(f"Running unit tests from {test_file}")
+    def __init__(
+        self, stats: Optional[TestStatistics] = None, jobs: int = 1, quiet: bool = False
+    ) -> None:
+        self.stats = stats if stats is not None else TestStatistics()
+        self.jobs = jobs
+        self.quiet = quiet
 
-        if test_file.endswith(".py"):
-            test_file = test_file[:-3]
+    def order_tests(
+        self, tests: Iterable[unittest.TestCase], operator: str
+    ) -> list[unittest.TestCase]:
+        """Order tests cheapest and most likely to kill a mutant of `operator` first."""
+        return self.stats.order(tests, operator)
 
-        test_file = test_file.replace("/", ".").replace("\\", ".")
+    def run_tests(self, test_file: str) -> TimedTestResult:
+        logging.info(f"Running unit tests from {test_file}")
 
-        test_module = importlib.import_module(test_file)
+        test_module = self.import_fresh(_module_name(test_file))
 
         suite = unittest.TestLoader().loadTestsFromModule(test_module)
-        runner = unittest.TextTestRunner(verbosity=2)
-        result = runner.run(suite)
+        return self._run_suite(suite)
+
+    def load_tests(self, test_file: str) -> list[unittest.TestCase]:
+        """(Re-)import the test file and return its test cases without running them."""
+        test_module = self.import_fresh(_module_name(test_file))
+        return list(iter_tests(unittest.TestLoader().loadTestsFromModule(test_module)))
+
+    def run_selected(self, tests: Iterable[unittest.TestCase]) -> TimedTestResult:
+        """Run only the given tests, e.g. the ones just repaired."""
+        tests = list(tests)
+        logging.info(f"Running {len(tests)} selected unit tests")
+        return self._run_suite(unittest.TestSuite(tests))
+
+    def _run_suite(self, suite: unittest.TestSuite) -> TimedTestResult:
+        tests = list(iter_tests(suite))
+        shards = min(self.jobs, len(tests) // MIN_TESTS_PER_SHARD)
+        groups = []
+        if (
+            shards > 1
+            and hasattr(os, "fork")
+            and self.stats.expected_duration(tests) >= MIN_SHARDED_DURATION
+        ):
+            groups = self.stats.balance(tests, shards)
+        if len(groups) > 1:
+            result = self._run_sharded(tests, groups)
+        elif self.quiet:
+            result = TimedTestResult()
+            suite.run(result)
+        else:
+            runner = unittest.TextTestRunner(verbosity=2, resultclass=TimedTextTestResult)
+            result = runner.run(suite)
+        self.stats.record_durations(result.durations)
         return result
 
+    def _run_sharded(
+        self, tests: list[unittest.TestCase], groups: list[list[unittest.TestCase]]
+    ) -> TimedTestResult:
+        """
+        Run the tests in forked workers, balanced by their recorded durations, and
+        merge what the workers report into one result holding this process's test
+        cases. The workers inherit the loaded (and hot-swapped) test classes, so
+        nothing is re-imported and they run exactly the tests loaded here.
+        """
+        global _shards
+        _shards = groups
+        logging.info(f"Running {len(tests)} unit tests in {len(_shards)} shards")
+        start = time.perf_counter()
+        try:
+            with multiprocessing.get_context("fork").Pool(len(_shards)) as pool:
+                outcomes = pool.map(_run_shard, range(len(_shards)))
+        finally:
+            _shards = []
+
+        if self.quiet:
+            result = TimedTestResult()
+        else:
+            result = TimedTextTestResult(unittest.runner._WritelnDecorator(sys.stderr), True, 2)
+        tests_by_id = {test.id(): test for test in tests}
+        for outcome in outcomes:
+            outcome.merge_into(result, tests_by_id)
+        if not self.quiet:
+            _print_sharded_result(result, tests, time.perf_counter() - start)
+        return result
+
+    def import_fresh(self, module_name: str):
+        """
+        Import the test module, re-executing it if it was imported before. The file
+        is rewritten between runs, so a cached module would run stale tests.
+        """
+        test_module = sys.modules.get(module_name)
+        if test_module is None:
+            return importlib.import_module(module_name)
+
+        source_file = getattr(test_module, "__file__", None)
+        if source_file is not None:
+            # the pyc check only looks at whole-second mtime and size, which a quick
+            # rewrite of similar length can slip past
+            try:
+                os.remove(importlib.util.cache_from_source(source_file))
+            except (OSError, NotImplementedError, ValueError):
+                pass
+            linecache.checkcache(source_file)
+        importlib.invalidate_caches()
+        return importlib.reload(test_module)
+
+    def hot_swap_tests(self, tests: Iterable[unittest.TestCase]) -> list[unittest.TestCase]:
+        """
+        Recompile only the given test methods from their rewritten source file and swap
+        them onto their TestCase classes, so they can be re-run without re-importing
+        the module. Returns the tests that could not be swapped (e.g. methods using
+        zero-argument super(), which need the class body); those need a full re-import.
+        """
+        not_swapped = []
+        trees: dict[str, ast.Module] = {}
+        for test in tests:
+            test_class = type(test)
+            method_name = test._testMethodName
+            source_file = inspect.getsourcefile(test_class)
+            module = sys.modules.get(test_class.__module__)
+            if source_file is None or module is None:
+                not_swapped.append(test)
+                continue
+            if source_file not in trees:
+                linecache.checkcache(source_file)
+                with open(source_file, "r") as file:
+                    trees[source_file] = ast.parse(file.read(), source_file)
+
+            method = find_test_method(trees[source_file], test_class.__name__, method_name)
+            if method is None or any(
+                isinstance(node, ast.Name) and node.id == "super" for node in ast.walk(method)
+            ):
+                not_swapped.append(test)
+                continue
+
+            # compiling the original node keeps file name and line numbers, so
+            # tracebacks and inspect.getsource point at the rewritten method
+            code = compile(ast.Module(body=[method], type_ignores=[]), source_file, "exec")
+            namespace: dict = {}
+            exec(code, module.__dict__, namespace)
+            function = namespace[method_name]
+            function.__qualname__ = f"{test_class.__qualname__}.{method_name}"
+            setattr(test_class, method_name, function)
+            logging.debug(f"Hot-swapped {test.id()}")
+        return not_swapped
+
     def get_failed_tests_source(
         self, test_results: unittest.TestResult
     ) -> dict[unittest.TestCase, str]:
@@ -29,8 +364,119 @@ class UnitTests:
         failed_tests_source = {}
 
         for failed_test, _ in test_results.failures + test_results.errors:
-            test_method = getattr(failed_test, failed_test._testMethodName)
+            # a failing subtest is fixed in its test, class fixture errors have no test method
+            failed_test = getattr(failed_test, "test_case", failed_test)
+            method_name = getattr(failed_test, "_testMethodName", None)
+            if method_name is None:
+                continue
+            test_method = getattr(failed_test, method_name)
             source_code = inspect.getsource(test_method)
             failed_tests_source[failed_test] = source_code
 
         return failed_tests_source
+
+
+@dataclass
+class _ShardOutcome:
+    """What a shard worker reports back: the contents of its TestResult, by test id."""
+
+    tests_run: int
+    durations: dict[str, float]
+    failures: list[tuple[str, str]]
+    errors: list[tuple[str, str]]
+    skipped: list[tuple[str, str]]
+    expected_failures: list[tuple[str, str]]
+    unexpected_successes: list[str]
+
+    @classmethod
+    def from_result(cls, result: TimedTestResult) -> "_ShardOutcome":
+        return cls(
+            tests_run=result.testsRun,
+            durations=result.durations,
+            failures=[(_test_id(test), text) for test, text in result.failures],
+            errors=[(_test_id(test), text) for test, text in result.errors],
+            skipped=[(_test_id(test), reason) for test, reason in result.skipped],
+            expected_failures=[(_test_id(test), text) for test, text in result.expectedFailures],
+            unexpected_successes=[_test_id(test) for test in result.unexpectedSuccesses],
+        )
+
+    def merge_into(
+        self, result: TimedTestResult, tests_by_id: dict[str, unittest.TestCase]
+    ) -> None:
+        def test(test_id: str) -> unittest.TestCase:
+            # class and module fixture errors are reported under a placeholder, as unittest does
+            return tests_by_id.get(test_id) or unittest.suite._ErrorHolder(test_id)
+
+        result.testsRun += self.tests_run
+        result.durations.update(self.durations)
+        result.failures.extend((test(test_id), text) for test_id, text in self.failures)
+        result.errors.extend((test(test_id), text) for test_id, text in self.errors)
+        result.skipped.extend((test(test_id), reason) for test_id, reason in self.skipped)
+        result.expectedFailures.extend(
+            (test(test_id), text) for test_id, text in self.expected_failures
+        )
+        result.unexpectedSuccesses.extend(map(test, self.unexpected_successes))
+
+
+# the shards of the running _run_sharded, inherited by its forked workers
+_shards: list[list[unittest.TestCase]] = []
+
+
+def _run_shard(index: int) -> _ShardOutcome:
+    result = TimedTestResult()
+    unittest.TestSuite(_shards[index]).run(result)
+    return _ShardOutcome.from_result(result)
+
+
+def _test_id(test: unittest.TestCase) -> str:
+    # failing subtests are reported as their test, which is what gets repaired
+    return getattr(test, "test_case", test).id()
+
+
+def _print_sharded_result(
+    result: TimedTextTestResult, tests: list[unittest.TestCase], elapsed: float
+) -> None:
+    """The report TextTestRunner prints, from a result merged after the fact."""
+    outcomes: dict[int, str] = {}
+    for test, _ in result.failures:
+        outcomes.setdefault(id(test), "FAIL")
+    for test, _ in result.errors:
+        outcomes.setdefault(id(test), "ERROR")
+    for test, reason in result.skipped:
+        outcomes[id(test)] = f"skipped {reason!r}"
+    for test, _ in result.expectedFailures:
+        outcomes[id(test)] = "expected failure"
+    for test in result.unexpectedSuccesses:
+        outcomes[id(test)] = "unexpected success"
+    stream = result.stream
+    for test in tests:
+        if test.id() not in result.durations:
+            continue  # never started, e.g. after a failing setUpClass
+        stream.writeln(f"{result.getDescription(test)} ... {outcomes.get(id(test), 'ok')}")
+    result.printErrors()
+    stream.writeln(result.separator2)
+    plural = "s" if result.testsRun != 1 else ""
+    stream.writeln(f"Ran {result.testsRun} test{plural} in {elapsed:.3f}s")
+    stream.writeln()
+    if result.wasSuccessful():
+        stream.writeln("OK")
+    else:
+        stream.writeln(f"FAILED (failures={len(result.failures)}, errors={len(result.errors)})")
+    stream.flush()
+
+
+def _module_name(test_file: str) -> str:
+    if test_file.endswith(".py"):
+        test_file = test_file[:-3]
+    if test_file.startswith("./"):
+        test_file = test_file[2:]
+    return test_file.replace("/", ".").replace("\\", ".")
+
+
+def iter_tests(suite: unittest.TestSuite):
+    """Flatten a (nested) test suite into its test cases."""
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from iter_tests(test)
+        else:
+            yield test
@@ -0,0 +1,57 @@
+import unittest
+from unit_tests import TestStatistics
+
+
+class Suite:
+    """Test classes to shard, nested so the loader does not run them."""
+
+    class Slow(unittest.TestCase):
+        def test_a(self):
+            pass
+
+        def test_b(self):
+            pass
+
+    class Fast(unittest.TestCase):
+        def test_c(self):
+            pass
+
+    class Other(unittest.TestCase):
+        def test_d(self):
+            pass
+
+
+def statistics(durations: dict[str, float]) -> TestStatistics:
+    stats = TestStatistics()
+    stats.record_durations(durations)
+    return stats
+
+
+class BalanceTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tests = [
+            Suite.Slow("test_a"), Suite.Fast("test_c"), Suite.Slow("test_b"), Suite.Other("test_d")
+        ]
+
+    def ids(self, groups) -> list[list[str]]:
+        return [[test._testMethodName for test in group] for group in groups]
+
+    def test_classes_are_not_split(self):
+        stats = statistics({test.id(): 1.0 for test in self.tests})
+        groups = stats.balance(self.tests, 4)
+        self.assertEqual(len(groups), 3)
+        self.assertIn(["test_a", "test_b"], self.ids(groups))
+
+    def test_slowest_class_gets_its_own_shard(self):
+        durations = {test.id(): 0.1 for test in self.tests}
+        durations[Suite.Slow("test_a").id()] = 5.0
+        groups = statistics(durations).balance(self.tests, 2)
+        self.assertEqual(sorted(self.ids(groups)), [["test_a", "test_b"], ["test_c", "test_d"]])
+
+    def test_single_class_is_one_shard(self):
+        tests = [Suite.Slow("test_a"), Suite.Slow("test_b")]
+        self.assertEqual(len(TestStatistics().balance(tests, 2)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()